@@ -2,15 +2,21 @@
 """Entry point for Claude-Codex Bridge - Intelligent Code Analysis & Planning Tool."""
 
 import argparse
-import asyncio
+import importlib.util
+import logging
 import os
 import sys
 
-from .bridge_server import mcp
+import anyio
 
+from .bridge_server import mcp, set_allow_write
 
-def main() -> None:
-    """Main entry point with command-line argument support."""
+
+_KNOWN_FLAGS = frozenset({"--allow-write", "--verbose"})
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    """Build the full argument parser, used only for --help and bad input."""
     parser = argparse.ArgumentParser(
         description="Claude-Codex Bridge - Leverages Codex's exceptional capabilities "
         "in code analysis, architectural planning, and complex problem-solving.",
@@ -27,16 +33,52 @@ def main() -> None:
 
     parser.add_argument("--verbose", action="store_true", help="Enable verbose output")
 
-    args = parser.parse_args()
+    return parser
+
+
+def _run_server() -> None:
+    """Serve over stdio, on uvloop for faster pipe I/O when it is installed."""
+    if importlib.util.find_spec("uvloop") is None:
+        mcp.run()
+        return
+    # Scope uvloop to this run; uvloop.install() swaps the global event loop
+    # policy and is deprecated from Python 3.12
+    anyio.run(mcp.run_stdio_async, backend_options={"use_uvloop": True})
+
+
+def main() -> None:
+    """Main entry point with command-line argument support."""
+    argv = sys.argv[1:]
+
+    if "-h" in argv or "--help" in argv:
+        _build_parser().print_help()
+        return
+
+    allow_write = "--allow-write" in argv
+    verbose = "--verbose" in argv
+
+    # Anything but the exact flag spellings goes through argparse, which
+    # reports bad input and expands abbreviations such as --allow
+    if not _KNOWN_FLAGS.issuperset(argv):
+        args = _build_parser().parse_args(argv)
+        allow_write = args.allow_write
+        verbose = args.verbose
+
+    # Log to stderr; stdout carries the MCP stdio protocol
+    logging.basicConfig(
+        level=logging.INFO if verbose else logging.WARNING,
+        stream=sys.stderr,
+    )
 
-    # Set environment variable for the server to use
-    os.environ["CODEX_ALLOW_WRITE"] = "true" if args.allow_write else "false"
+    # The server read its environment at import; apply the flag directly
+    os.environ["CODEX_ALLOW_WRITE"] = "true" if allow_write else "false"
+    set_allow_write(allow_write)
 
     # Display startup information
-    mode = "READ-WRITE" if args.allow_write else "READ-ONLY (Planning & Analysis)"
+    mode = "READ-WRITE" if allow_write else "READ-ONLY (Planning & Analysis)"
     print(f"🧠 Starting Claude-Codex Bridge in {mode} mode", file=sys.stderr)
 
-    if not args.allow_write:
+    if not allow_write:
         print(
             "📋 Codex will analyze and provide recommendations without modifying files.",
             file=sys.stderr,
@@ -46,7 +88,7 @@ def main() -> None:
             file=sys.stderr,
         )
 
-    asyncio.run(mcp.run())  # type: ignore[func-returns-value]
+    _run_server()
 
 
 if __name__ == "__main__":
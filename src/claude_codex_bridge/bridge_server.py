@@ -6,9 +6,16 @@ between Claude and OpenAI Codex CLI.
 """
 
 import asyncio
+import atexit
+import functools
 import json
+import logging
 import os
-from typing import Any, Dict, List, Literal, Optional, Tuple, Union
+import re
+import signal
+import subprocess  # nosec B404
+import time
+from typing import Any, Dict, List, Literal, Optional, Set, Tuple, Union
 
 from mcp.server.fastmcp import FastMCP
 
@@ -20,6 +27,28 @@ except ImportError:
     from cache import ResultCache  # type: ignore[no-redef]
     from engine import DelegationDecisionEngine  # type: ignore[no-redef]
 
+logger = logging.getLogger(__name__)
+
+# Tool responses can carry large Codex outputs, so serialize them with orjson
+# when it is installed; both produce 2-space indented, non-ASCII-escaped JSON.
+try:
+    import orjson
+
+    def _dumps(obj: Any) -> str:
+        encoded: str = orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode("utf-8")
+        return encoded
+
+except ImportError:
+    # json.dumps builds a new encoder whenever options are passed; reuse one
+    _encoder = json.JSONEncoder(indent=2, ensure_ascii=False)
+
+    def _dumps(obj: Any) -> str:
+        return _encoder.encode(obj)
+
+
+# Keywords that mark plain-text output as code, matched case-insensitively
+_CODE_KEYWORDS_RE = re.compile(rb"file:|class |function |def |import ", re.IGNORECASE)
+
 # Initialize FastMCP instance
 mcp = FastMCP(
     name="claude-codex-bridge",
@@ -43,9 +72,282 @@ dde = DelegationDecisionEngine()
 # Initialize result cache
 cache_ttl = int(os.environ.get("CACHE_TTL", "3600"))  # Default 1 hour
 cache_max_size = int(os.environ.get("MAX_CACHE_SIZE", "100"))  # Default 100 entries
-result_cache = ResultCache(ttl=cache_ttl, max_size=cache_max_size)
+cache_persist_path = os.environ.get("CACHE_PERSIST_PATH")  # Default memory only
+result_cache = ResultCache(
+    ttl=cache_ttl, max_size=cache_max_size, persist_path=cache_persist_path
+)
+# Flush and release the persistent store when the server exits
+atexit.register(result_cache.close)
+
+# Expired cache entries are swept by a background task rather than on the
+# request path (0 disables the sweeper)
+_CACHE_SWEEP_INTERVAL = float(os.environ.get("CACHE_SWEEP_INTERVAL", "60"))
+_sweeper_task: Optional["asyncio.Task[None]"] = None
+_last_sweep: Dict[str, Any] = {"last_sweep_at": None, "last_sweep_expired": 0}
+
+
+async def _sweep_cache_periodically() -> None:
+    """Drop expired cache entries every _CACHE_SWEEP_INTERVAL seconds."""
+    while True:
+        await asyncio.sleep(_CACHE_SWEEP_INTERVAL)
+        expired = await asyncio.to_thread(result_cache.cleanup_expired)
+        _last_sweep.update(last_sweep_at=time.time(), last_sweep_expired=expired)
+
+
+def _ensure_cache_sweeper() -> None:
+    """Start the cache sweeper on the running loop if it is not running."""
+    global _sweeper_task
+    if _CACHE_SWEEP_INTERVAL <= 0:
+        return
+    if _sweeper_task is None or _sweeper_task.done():
+        _sweeper_task = asyncio.create_task(_sweep_cache_periodically())
+
+
+# Directories that passed validation, mapped to when that result expires.
+# Only successes are remembered, so a directory created after a failed
+# call is accepted immediately.
+_WD_VALIDATE_TTL = float(os.environ.get("WD_VALIDATE_TTL", "60"))  # 0 disables
+_WD_VALIDATE_MAX_ENTRIES = 64
+_valid_directories: Dict[str, float] = {}
+
+
+def _validate_working_directory(directory: str) -> bool:
+    """Validate a working directory, reusing recent successful results."""
+    now = time.monotonic()
+    expires_at = _valid_directories.get(directory)
+    if expires_at is not None and expires_at > now:
+        return True
+
+    if not dde.validate_working_directory(directory):
+        _valid_directories.pop(directory, None)
+        return False
+
+    if _WD_VALIDATE_TTL > 0:
+        if len(_valid_directories) >= _WD_VALIDATE_MAX_ENTRIES:
+            _valid_directories.clear()
+        _valid_directories[directory] = now + _WD_VALIDATE_TTL
+    return True
+
+
+# Whether Codex may write files; read once at import (default: False for safety)
+_ALLOW_WRITE = os.environ.get("CODEX_ALLOW_WRITE", "false").lower() == "true"
+
+
+def set_allow_write(enabled: bool) -> None:
+    """Enable or disable write operations for subsequent delegations."""
+    global _ALLOW_WRITE
+    _ALLOW_WRITE = enabled
+
+
+# Notice attached to results when a write sandbox is downgraded to read-only.
+# Shared between calls, so it must not be mutated.
+_MODE_NOTICE_PLANNING: Dict[str, Union[str, List[str]]] = {
+    "mode": "planning",
+    "description": "Operating in planning and analysis mode (read-only)",
+    "message": (
+        "Codex will analyze your code and provide detailed "
+        "recommendations without modifying files."
+    ),
+    "hint": "To apply changes, restart the server with --allow-write flag",
+    "benefits": [
+        "Safe exploration of solutions",
+        "Comprehensive analysis without risk",
+        "Thoughtful planning before execution",
+    ],
+}
+
+# Response for tasks the decision engine declines, serialized once
+_REJECTION_JSON = _dumps(
+    {
+        "status": "rejected",
+        "message": "The task is not suitable for delegation to Codex CLI",
+        "reason": "Task not suitable for Codex delegation",
+    }
+)
+
+
+# Starts Codex processes on the event loop; tests replace it with a fake
+_RUNNER = asyncio.create_subprocess_exec
+
+# Spawn Codex with subprocess.Popen in a worker thread instead of on the
+# event loop, so bursts of calls do not stall it on fork/exec setup
+_THREADED_SPAWN = os.environ.get("CODEX_THREADED_SPAWN", "false").lower() == "true"
+
+
+class _ThreadedProcess:
+    """Adapts subprocess.Popen to the asyncio.subprocess.Process calls used here."""
+
+    def __init__(self, popen: "subprocess.Popen[bytes]"):
+        self._popen = popen
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self._popen.poll()
+
+    async def communicate(self, input: Optional[bytes] = None) -> Tuple[bytes, bytes]:
+        return await asyncio.to_thread(self._popen.communicate, input)
+
+    async def wait(self) -> int:
+        return await asyncio.to_thread(self._popen.wait)
+
+    def send_signal(self, sig: int) -> None:
+        self._popen.send_signal(sig)
+
+    def terminate(self) -> None:
+        self._popen.terminate()
+
+    def kill(self) -> None:
+        self._popen.kill()
+
+
+_CodexProcess = Union[asyncio.subprocess.Process, _ThreadedProcess]
+
+# Upper bound on Codex CLI processes running at once, so bursts of tool
+# calls queue instead of each spawning a process
+_MAX_CONCURRENT_CODEX = int(os.environ.get("MAX_CONCURRENT_CODEX", "4"))
+_codex_semaphore = asyncio.BoundedSemaphore(_MAX_CONCURRENT_CODEX)
+
+# Runs in progress, keyed by request parameters, so identical concurrent
+# requests share one Codex invocation instead of each spawning their own
+_in_flight: Dict[str, "asyncio.Future[str]"] = {}
+
+# Signals sent in turn to a timed-out Codex process, each followed by a grace
+# period in seconds, before falling back to SIGKILL (Windows only has SIGTERM)
+_STOP_SIGNALS = (
+    (signal.SIGTERM,) if os.name == "nt" else (signal.SIGINT, signal.SIGTERM)
+)
+_STOP_GRACE = 2.0
+
+# Idle Codex processes prespawned for the most recently used command line,
+# each waiting for its prompt on stdin (0 disables prespawning)
+_CODEX_POOL_SIZE = int(os.environ.get("CODEX_POOL_SIZE", "0"))
+_warm_command: Optional[Tuple[str, ...]] = None
+_warm_processes: List[_CodexProcess] = []
+_warm_tasks: Set["asyncio.Task[None]"] = set()
+
+
+async def _spawn_codex(
+    command: Tuple[str, ...], working_directory: str, stdin: Optional[int] = None
+) -> _CodexProcess:
+    """Start a Codex CLI process with piped output."""
+    if _THREADED_SPAWN:
+        # Fixed argv tuple and no shell, hence the nosec on the import
+        popen = await asyncio.to_thread(
+            subprocess.Popen,
+            command,
+            stdin=stdin,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=working_directory,
+        )
+        return _ThreadedProcess(popen)
+    return await _RUNNER(
+        *command,
+        stdin=stdin,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=working_directory,  # Also set as double protection
+    )
+
 
-# Write operations will be checked dynamically in codex_delegate function
+def _take_warm_process(
+    command: Tuple[str, ...],
+) -> Optional[_CodexProcess]:
+    """Pop an idle prespawned process for this command line, if one is alive."""
+    if command != _warm_command:
+        return None
+    while _warm_processes:
+        process = _warm_processes.pop()
+        if process.returncode is None:
+            return process
+    return None
+
+
+async def _refill_warm_pool(command: Tuple[str, ...], working_directory: str) -> None:
+    """Prespawn processes for `command` until the pool is full."""
+    global _warm_command
+    if command != _warm_command:
+        # Only the latest configuration is kept warm; drop stale processes
+        stale = list(_warm_processes)
+        _warm_processes.clear()
+        _warm_command = command
+        for process in stale:
+            await _discard_warm_process(process)
+
+    while len(_warm_processes) < _CODEX_POOL_SIZE:
+        try:
+            process = await _spawn_codex(
+                command, working_directory, stdin=asyncio.subprocess.PIPE
+            )
+        except OSError:
+            return
+        if command != _warm_command or len(_warm_processes) >= _CODEX_POOL_SIZE:
+            # Configuration changed or a concurrent refill won while spawning
+            await _discard_warm_process(process)
+            return
+        _warm_processes.append(process)
+
+
+async def _discard_warm_process(process: _CodexProcess) -> None:
+    """Kill an idle prespawned process and reap it so it is not left a zombie."""
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+    await process.wait()
+
+
+async def _stop_process(process: _CodexProcess) -> None:
+    """Stop a Codex process, escalating signals, and always reap it."""
+    for sig in _STOP_SIGNALS:
+        try:
+            process.send_signal(sig)
+        except ProcessLookupError:
+            break
+        try:
+            # Shield the wait so timing out does not abandon the reaping
+            await asyncio.wait_for(asyncio.shield(process.wait()), _STOP_GRACE)
+            return
+        except asyncio.TimeoutError:
+            continue
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+    await process.wait()
+
+
+@atexit.register
+def _kill_warm_processes() -> None:
+    """Kill prespawned processes still waiting for a prompt at shutdown."""
+    for process in _warm_processes:
+        if process.returncode is None:
+            try:
+                process.kill()
+            except (OSError, RuntimeError):
+                pass
+    _warm_processes.clear()
+
+
+@functools.lru_cache(maxsize=None)
+def _codex_mode_flags(
+    execution_mode: str, sandbox_mode: str, allow_write: bool
+) -> Tuple[str, ...]:
+    """Codex CLI flags for a mode combination; only a handful ever occur."""
+    # Disable file operations by using empty sandbox_permissions
+    permissions = () if allow_write else ("-c", "sandbox_permissions=[]")
+
+    # Use convenient --full-auto mode only when write is allowed; otherwise
+    # specify sandbox mode only (approval mode not available for exec)
+    if (
+        execution_mode == "on-failure"
+        and sandbox_mode == "workspace-write"
+        and allow_write
+    ):
+        return (*permissions, "--full-auto")
+    return (*permissions, "-s", sandbox_mode)
 
 
 async def invoke_codex_cli(
@@ -55,7 +357,7 @@ async def invoke_codex_cli(
     sandbox_mode: str,
     allow_write: bool = True,
     timeout: int = 300,  # 5 minute timeout
-) -> Tuple[str, str]:
+) -> Tuple[bytes, bytes]:
     """
     Asynchronously invoke Codex CLI and return its stdout and stderr.
 
@@ -68,76 +370,63 @@ async def invoke_codex_cli(
         timeout: Command timeout in seconds
 
     Returns:
-        Tuple containing (stdout, stderr)
+        Tuple containing raw (stdout, stderr) bytes; callers decode only
+        what they use
 
     Raises:
         RuntimeError: When Codex CLI execution fails
         asyncio.TimeoutError: When command times out
     """
-    # Build base command
-    command = ["codex", "exec"]
-
-    # Always specify working directory (critical)
-    command.extend(["-C", working_directory])
-
-    # Configure file write permissions through sandbox_permissions
-    if not allow_write:
-        # Disable file operations by using empty sandbox_permissions
-        command.extend(["-c", "sandbox_permissions=[]"])
-
-    # Use convenience mode or specify parameters separately
-    if (
-        execution_mode == "on-failure"
-        and sandbox_mode == "workspace-write"
-        and allow_write
-    ):
-        # Use convenient --full-auto mode (only when write is allowed)
-        command.append("--full-auto")
-    else:
-        # Specify sandbox mode only (approval mode not available for exec subcommand)
-        command.extend(["-s", sandbox_mode])
-
-    # Add delimiter to ensure any leading dashes in prompt
-    # are treated as positional text, not CLI flags
-    command.append("--")
-
-    # Add prompt as final positional argument
-    command.append(prompt)
+    command = (
+        "codex",
+        "exec",
+        # Always specify working directory (critical)
+        "-C",
+        working_directory,
+        *_codex_mode_flags(execution_mode, sandbox_mode, allow_write),
+        # Delimiter so leading dashes in the prompt are treated as
+        # positional text, not CLI flags
+        "--",
+    )
 
     process = None
     try:
-        # Execute subprocess asynchronously
-        process = await asyncio.create_subprocess_exec(
-            *command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            cwd=working_directory,  # Also set as double protection
-        )
+        if _CODEX_POOL_SIZE > 0:
+            # "-" makes Codex read the prompt from stdin, so the process can
+            # be started before the prompt is known
+            command += ("-",)
+            process = _take_warm_process(command) or await _spawn_codex(
+                command, working_directory, stdin=asyncio.subprocess.PIPE
+            )
+            task = asyncio.create_task(_refill_warm_pool(command, working_directory))
+            _warm_tasks.add(task)
+            task.add_done_callback(_warm_tasks.discard)
+            communicate = process.communicate(prompt.encode("utf-8"))
+        else:
+            process = await _spawn_codex(command + (prompt,), working_directory)
+            communicate = process.communicate()
 
         # Wait for process completion (with timeout)
-        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+        stdout, stderr = await asyncio.wait_for(communicate, timeout=timeout)
 
         # Check exit code
         if process.returncode != 0:
             error_message = (
-                stderr.decode("utf-8").strip() if stderr else "Unknown error"
+                stderr.decode("utf-8", errors="replace").strip()
+                if stderr
+                else "Unknown error"
             )
             raise RuntimeError(
                 f"Codex CLI execution failed (exit code: {process.returncode}): "
                 f"{error_message}"
             )
 
-        return stdout.decode("utf-8"), stderr.decode("utf-8")
+        return stdout, stderr
 
     except asyncio.TimeoutError:
         # Timeout handling
         if process is not None:
-            try:
-                process.terminate()
-                await asyncio.wait_for(process.wait(), timeout=5)
-            except asyncio.TimeoutError:
-                process.kill()
-                await process.wait()
+            await _stop_process(process)
 
         raise asyncio.TimeoutError(
             f"Codex CLI execution timed out (exceeded {timeout} seconds)"
@@ -150,12 +439,12 @@ async def invoke_codex_cli(
         )
 
 
-def parse_codex_output(stdout: str, output_format: str) -> dict:
+def parse_codex_output(stdout: bytes, output_format: str) -> dict:
     """
     Parse Codex CLI output into structured JSON.
 
     Args:
-        stdout: Codex CLI standard output
+        stdout: Codex CLI standard output (raw bytes)
         output_format: Expected output format
 
     Returns:
@@ -164,25 +453,121 @@ def parse_codex_output(stdout: str, output_format: str) -> dict:
     # Auto-detect output type
     output_type = "explanation"  # Default type
 
-    if "--- a/" in stdout and "+++ b/" in stdout:
+    # Classify on the raw bytes; only the returned content is decoded
+    if b"--- a/" in stdout and b"+++ b/" in stdout:
         output_type = "diff"
-    elif "```" in stdout and stdout.count("```") >= 2:
-        output_type = "code"
-    elif any(
-        keyword in stdout.lower()
-        for keyword in ["file:", "class ", "function ", "def ", "import "]
-    ):
-        output_type = "code"
+    else:
+        # Two fences make a code block; stop scanning after the second one
+        fence = stdout.find(b"```")
+        if fence != -1 and stdout.find(b"```", fence + 3) != -1:
+            output_type = "code"
+        # One regex pass instead of lowering a copy of the whole output
+        elif _CODE_KEYWORDS_RE.search(stdout):
+            output_type = "code"
 
     return {
         "status": "success",
         "type": output_type,
-        "content": stdout.strip(),
+        "content": stdout.strip().decode("utf-8", errors="replace"),
         "format": output_format,
         "detected_type": output_type,
     }
 
 
+async def _run_delegation(
+    task_description: str,
+    working_directory: str,
+    execution_mode: str,
+    sandbox_mode: str,
+    effective_sandbox_mode: str,
+    output_format: str,
+    allow_write: bool,
+    mode_notice: Optional[Dict[str, Union[str, List[str]]]],
+    files_hash: Optional[str] = None,
+) -> str:
+    """Run one Codex delegation after the cache missed and return its JSON."""
+    # Prepare Codex instruction
+    codex_prompt = dde.prepare_codex_prompt(task_description)
+    optimization_note = None  # Will be used for metacognitive optimization in future
+
+    try:
+        # Invoke Codex CLI
+        async with _codex_semaphore:
+            stdout, stderr = await invoke_codex_cli(
+                codex_prompt,
+                working_directory,
+                execution_mode,
+                effective_sandbox_mode,
+                allow_write,
+            )
+
+        # Parse output
+        result = parse_codex_output(stdout, output_format)
+
+        # Add metadata
+        result.update(
+            {
+                "working_directory": working_directory,
+                "execution_mode": execution_mode,
+                "sandbox_mode": effective_sandbox_mode,
+                "requested_sandbox_mode": sandbox_mode,
+                "optimization_note": optimization_note,
+                "original_task": task_description,
+                "codex_prompt": (
+                    codex_prompt if codex_prompt != task_description else None
+                ),
+            }
+        )
+
+        # Add operation mode notice if applicable
+        if mode_notice:
+            result["operation_mode"] = mode_notice
+
+        # If there is stderr, include it as well
+        stderr = stderr.strip()
+        if stderr:
+            result["stderr"] = stderr.decode("utf-8", errors="replace")
+
+        # Add cache flag
+        result["cache_hit"] = False
+
+        # Store result in cache (only on success)
+        try:
+            await result_cache.aset(
+                task_description,
+                working_directory,
+                execution_mode,
+                effective_sandbox_mode,
+                output_format,
+                result,
+                files_hash=files_hash,
+            )
+        except Exception as cache_error:
+            # Cache failure should not affect main functionality
+            logger.warning("Failed to store cache: %s", cache_error)
+
+        return _dumps(result)
+
+    except Exception as e:
+        # Handle execution errors
+        error_result: Dict[str, Any] = {
+            "status": "error",
+            "message": str(e),
+            "error_type": type(e).__name__,
+            "working_directory": working_directory,
+            "execution_mode": execution_mode,
+            "sandbox_mode": effective_sandbox_mode,
+            "requested_sandbox_mode": sandbox_mode,
+            "optimization_note": "",  # No optimization applied on error
+        }
+
+        # Add operation mode notice if applicable
+        if mode_notice:
+            error_result["operation_mode"] = mode_notice
+
+        return _dumps(error_result)
+
+
 @mcp.tool()
 async def codex_delegate(
     task_description: str,
@@ -219,41 +604,38 @@ async def codex_delegate(
     Returns:
         Detailed analysis, recommendations, or implementation plan
     """
-    # 1. Validate working directory
-    if not dde.validate_working_directory(working_directory):
+    # 1. Enforce read-only mode if write is not allowed
+    effective_sandbox_mode = sandbox_mode
+    mode_notice: Optional[Dict[str, Union[str, List[str]]]] = None
+
+    # Check if write operations are allowed
+    allow_write = _ALLOW_WRITE
+
+    if not allow_write and sandbox_mode != "read-only":
+        effective_sandbox_mode = "read-only"
+        mode_notice = _MODE_NOTICE_PLANNING
+
+    # 2. Validate working directory
+    if not _validate_working_directory(working_directory):
         error_result: Dict[str, Any] = {
             "status": "error",
             "message": f"Invalid or unsafe working directory: {working_directory}",
             "error_type": "invalid_directory",
+            "sandbox_mode": effective_sandbox_mode,
+            "requested_sandbox_mode": sandbox_mode,
         }
-        return json.dumps(error_result, indent=2, ensure_ascii=False)
 
-    # 2. Enforce read-only mode if write is not allowed
-    effective_sandbox_mode = sandbox_mode
-    mode_notice: Optional[Dict[str, Union[str, List[str]]]] = None
+        # Add operation mode notice if applicable
+        if mode_notice:
+            error_result["operation_mode"] = mode_notice
 
-    # Check if write operations are allowed (default: False for safety)
-    allow_write = os.environ.get("CODEX_ALLOW_WRITE", "false").lower() == "true"
+        return _dumps(error_result)
 
-    if not allow_write and sandbox_mode != "read-only":
-        effective_sandbox_mode = "read-only"
-        mode_notice = {
-            "mode": "planning",
-            "description": "Operating in planning and analysis mode (read-only)",
-            "message": (
-                "Codex will analyze your code and provide detailed "
-                "recommendations without modifying files."
-            ),
-            "hint": "To apply changes, restart the server with --allow-write flag",
-            "benefits": [
-                "Safe exploration of solutions",
-                "Comprehensive analysis without risk",
-                "Thoughtful planning before execution",
-            ],
-        }
+    # Rejected calls above return without touching the cache or its sweeper
+    _ensure_cache_sweeper()
 
     # 3. Check cache
-    cached_result = result_cache.get(
+    cached_result, files_hash = await result_cache.aget_with_files_hash(
         task_description,
         working_directory,
         execution_mode,
@@ -261,103 +643,46 @@ async def codex_delegate(
         output_format,
     )
     if cached_result:
-        # Parse cached result and add cache flag
-        try:
-            result_dict = json.loads(cached_result)
-            result_dict["cache_hit"] = True
-            result_dict["cache_note"] = "This result comes from the cache"
-            return json.dumps(result_dict, indent=2, ensure_ascii=False)
-        except json.JSONDecodeError:
-            # Invalid cache result format, continue with normal execution
-            pass
+        # Copy so the cached dict itself is never mutated, then add cache flag
+        result_dict = dict(cached_result)
+        result_dict["cache_hit"] = True
+        result_dict["cache_note"] = "This result comes from the cache"
+        return _dumps(result_dict)
 
     # 3. Use DDE to decide whether to delegate
     if not dde.should_delegate(task_description):
-        rejection_result = {
-            "status": "rejected",
-            "message": "The task is not suitable for delegation to Codex CLI",
-            "reason": "Task not suitable for Codex delegation",
-        }
-        return json.dumps(rejection_result, indent=2, ensure_ascii=False)
-
-    # 4. Prepare Codex instruction
-    codex_prompt = dde.prepare_codex_prompt(task_description)
-    optimization_note = None  # Will be used for metacognitive optimization in future
-
-    try:
-        # 5. Invoke Codex CLI
-        stdout, stderr = await invoke_codex_cli(
-            codex_prompt,
-            working_directory,
-            execution_mode,
-            effective_sandbox_mode,
-            allow_write,
-        )
-
-        # 6. Parse output
-        result = parse_codex_output(stdout, output_format)
-
-        # Add metadata
-        result.update(
-            {
-                "working_directory": working_directory,
-                "execution_mode": execution_mode,
-                "sandbox_mode": effective_sandbox_mode,
-                "requested_sandbox_mode": sandbox_mode,
-                "optimization_note": optimization_note,
-                "original_task": task_description,
-                "codex_prompt": (
-                    codex_prompt if codex_prompt != task_description else None
-                ),
-            }
-        )
+        return _REJECTION_JSON
 
-        # Add operation mode notice if applicable
-        if mode_notice:
-            result["operation_mode"] = mode_notice
-
-        # If there is stderr, include it as well
-        if stderr.strip():
-            result["stderr"] = stderr.strip()
-
-        # Add cache flag
-        result["cache_hit"] = False
-
-        # 7. Store result in cache (only on success)
-        result_json = json.dumps(result, indent=2, ensure_ascii=False)
-        try:
-            result_cache.set(
+    # 4. Coalesce identical concurrent requests onto a single Codex run
+    flight_key = result_cache.make_key(
+        task_description,
+        working_directory,
+        execution_mode,
+        effective_sandbox_mode,
+        output_format,
+    )
+    in_flight = _in_flight.get(flight_key)
+    if in_flight is None:
+        in_flight = asyncio.ensure_future(
+            _run_delegation(
                 task_description,
                 working_directory,
                 execution_mode,
+                sandbox_mode,
                 effective_sandbox_mode,
                 output_format,
-                result_json,
+                allow_write,
+                mode_notice,
+                # A read-only run leaves the files as the lookup hashed them,
+                # so the store can reuse that hash instead of walking again
+                files_hash if effective_sandbox_mode == "read-only" else None,
             )
-        except Exception as cache_error:
-            # Cache failure should not affect main functionality
-            print(f"Failed to store cache: {cache_error}")
-
-        return result_json
-
-    except Exception as e:
-        # Handle execution errors
-        error_result = {
-            "status": "error",
-            "message": str(e),
-            "error_type": type(e).__name__,
-            "working_directory": working_directory,
-            "execution_mode": execution_mode,
-            "sandbox_mode": effective_sandbox_mode,
-            "requested_sandbox_mode": sandbox_mode,
-            "optimization_note": "",  # No optimization applied on error
-        }
-
-        # Add operation mode notice if applicable
-        if mode_notice:
-            error_result["operation_mode"] = mode_notice
+        )
+        _in_flight[flight_key] = in_flight
+        in_flight.add_done_callback(lambda _: _in_flight.pop(flight_key, None))
 
-        return json.dumps(error_result, indent=2, ensure_ascii=False)
+    # Shield so one cancelled caller does not cancel the run for the others
+    return await asyncio.shield(in_flight)
 
 
 @mcp.tool()
@@ -368,16 +693,16 @@ async def cache_stats() -> str:
     Returns:
         JSON string containing cache statistics
     """
-    try:
-        # Clean up expired cache
-        expired_count = result_cache.cleanup_expired()
+    _ensure_cache_sweeper()
 
-        # Get statistics
+    try:
+        # Expired entries are cleaned up by the background sweeper
         stats = result_cache.get_stats()
 
-        stats.update({"cleaned_expired_entries": expired_count, "status": "success"})
+        stats.update(_last_sweep)
+        stats["status"] = "success"
 
-        return json.dumps(stats, indent=2, ensure_ascii=False)
+        return _dumps(stats)
 
     except Exception as e:
         error_result = {
@@ -385,7 +710,7 @@ async def cache_stats() -> str:
             "message": f"Failed to get cache statistics: {str(e)}",
             "error_type": type(e).__name__,
         }
-        return json.dumps(error_result, indent=2, ensure_ascii=False)
+        return _dumps(error_result)
 
 
 @mcp.tool()
@@ -406,7 +731,7 @@ async def clear_cache() -> str:
             "cleared_entries": old_stats["total_entries"],
         }
 
-        return json.dumps(result, indent=2, ensure_ascii=False)
+        return _dumps(result)
 
     except Exception as e:
         error_result = {
@@ -414,7 +739,7 @@ async def clear_cache() -> str:
             "message": f"Failed to clear cache: {str(e)}",
             "error_type": type(e).__name__,
         }
-        return json.dumps(error_result, indent=2, ensure_ascii=False)
+        return _dumps(error_result)
 
 
 @mcp.resource("bridge://docs/usage")
@@ -774,6 +1099,26 @@ except ImportError:
 
     UserMessage = FallbackUserMessage
 
+# Fixed parts of the prompt templates, built once at import
+_REFACTOR_DESCRIPTIONS = {
+    "general": "Perform general code refactoring to improve code quality",
+    "performance": "Refactor code to improve performance and efficiency",
+    "readability": "Refactor code to improve readability and maintainability",
+    "structure": "Refactor code structure to improve architectural design",
+}
+_REFACTOR_CLOSING = (
+    "Please ensure the working directory is set correctly before "
+    "calling the codex_delegate tool."
+)
+_TESTS_COVERAGE_NOTE = (
+    "This will include comprehensive test coverage, including edge "
+    "cases and exception scenarios."
+)
+_TESTS_CLOSING = (
+    "Please call the codex_delegate tool after setting the correct "
+    "working directory."
+)
+
 
 @mcp.prompt()
 def refactor_code(file_path: str, refactor_type: str = "general") -> list:
@@ -785,14 +1130,7 @@ def refactor_code(file_path: str, refactor_type: str = "general") -> list:
         refactor_type: The type of refactoring (general, performance,
             readability, structure)
     """
-    refactor_descriptions = {
-        "general": "Perform general code refactoring to improve code quality",
-        "performance": "Refactor code to improve performance and efficiency",
-        "readability": "Refactor code to improve readability and maintainability",
-        "structure": "Refactor code structure to improve architectural design",
-    }
-
-    description = refactor_descriptions.get(refactor_type, "Refactor code")
+    description = _REFACTOR_DESCRIPTIONS.get(refactor_type, "Refactor code")
 
     task_description = (
         f"Please {description} for the file '{file_path}'. Keep the original "
@@ -804,10 +1142,7 @@ def refactor_code(file_path: str, refactor_type: str = "general") -> list:
         UserMessage(f"I will refactor the {file_path} file for you."),
         UserMessage(f"Refactoring type: {refactor_type}"),
         UserMessage(f"Task: {task_description}"),
-        UserMessage(
-            "Please ensure the working directory is set correctly before "
-            "calling the codex_delegate tool."
-        ),
+        UserMessage(_REFACTOR_CLOSING),
     ]
 
 
@@ -833,15 +1168,9 @@ def generate_tests(file_path: str, test_framework: str = "pytest") -> list:
 
     return [
         UserMessage(f"I will generate {test_framework} test cases for {file_path}."),
-        UserMessage(
-            "This will include comprehensive test coverage, including edge "
-            "cases and exception scenarios."
-        ),
+        UserMessage(_TESTS_COVERAGE_NOTE),
         UserMessage(f"Task description: {task_description}"),
-        UserMessage(
-            "Please call the codex_delegate tool after setting the correct "
-            "working directory."
-        ),
+        UserMessage(_TESTS_CLOSING),
     ]
 
 
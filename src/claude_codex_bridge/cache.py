@@ -5,11 +5,285 @@ Provides result caching functionality to improve performance and avoid
 duplicate execution of same tasks.
 """
 
+import asyncio
+import functools
 import hashlib
+import heapq
 import json
+import mmap
 import os
+import sqlite3
+import threading
 import time
-from typing import Any, Dict, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Directory fingerprints are not security tokens, so prefer the fastest
+# available hasher: BLAKE3 (SIMD), then xxh3, then stdlib MD5.
+try:
+    from blake3 import blake3 as _new_hasher
+except ImportError:
+    try:
+        from xxhash import xxh3_128 as _new_hasher  # type: ignore[assignment]
+    except ImportError:
+
+        def _new_hasher(data: bytes = b"") -> Any:  # type: ignore[no-redef,misc]
+            return hashlib.md5(data, usedforsecurity=False)  # noqa: S324
+
+
+# Honour the project's .gitignore when pathspec is installed, so build output
+# and other ignored files neither cost hashing time nor invalidate the cache
+try:
+    import pathspec
+except ImportError:
+    pathspec = None  # type: ignore[assignment]
+
+# Read size used when streaming file contents into the hasher
+_HASH_CHUNK_SIZE = 1 << 20
+
+# Directories never descended into and file types never hashed
+# (hidden entries are skipped as well)
+_SKIP_DIRS = frozenset({"node_modules", "__pycache__", ".git", "venv", "dist", "build"})
+_SKIP_EXT = (".pyc", ".so", ".exe", ".bin")
+
+# Below this many files, thread pool startup costs more than it saves
+_PARALLEL_HASH_MIN_FILES = 8
+
+# Thread pool shared by all directory hashes, so each hash does not pay for
+# starting and joining its own worker threads
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Seeded key hashers kept per (directory, files hash) pair
+_KEY_SEEDS_MAX = 256
+
+# Files modified this recently may still change within the same mtime tick,
+# so their directory hash is never memoized (same idea as git's "racy" check)
+_RACY_WINDOW_NS = 2_000_000_000
+
+
+def _load_gitignore(root: str) -> Any:
+    """Return a matcher for the root .gitignore, or None if unavailable."""
+    if pathspec is None:
+        return None
+    try:
+        with open(
+            os.path.join(root, ".gitignore"), encoding="utf-8", errors="replace"
+        ) as f:
+            return pathspec.GitIgnoreSpec.from_lines(f)
+    except OSError:
+        return None
+
+
+def _iter_files(root: str) -> Iterator["os.DirEntry[str]"]:
+    """
+    Yield the files under a directory that take part in its fingerprint.
+
+    Uses os.scandir directly so the file type cached in each DirEntry is
+    reused instead of stat-ing every path again.
+
+    Args:
+        root: The directory to walk
+
+    Yields:
+        DirEntry objects for the non-hidden, non-binary, non-ignored files
+    """
+    ignore = _load_gitignore(root)
+    prefix_len = len(os.path.join(root, ""))
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if name.startswith("."):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if name not in _SKIP_DIRS and not (
+                                ignore is not None
+                                and ignore.match_file(entry.path[prefix_len:] + "/")
+                            ):
+                                stack.append(entry.path)
+                        elif (
+                            entry.is_file()
+                            and not name.endswith(_SKIP_EXT)
+                            and not (
+                                ignore is not None
+                                and ignore.match_file(entry.path[prefix_len:])
+                            )
+                        ):
+                            yield entry
+                    except OSError:
+                        continue
+        except OSError:
+            # Skip directories that cannot be listed
+            continue
+
+
+def _hash_file(file_path: str) -> Optional[str]:
+    """
+    Hash a single file's content.
+
+    Args:
+        file_path: The file path to hash
+
+    Returns:
+        Hex digest of the file content, or None if it cannot be read
+    """
+    try:
+        hasher = _new_hasher()
+        with open(file_path, "rb") as f:
+            # Most source files fit in one read
+            head = f.read(_HASH_CHUNK_SIZE)
+            hasher.update(head)
+            if len(head) == _HASH_CHUNK_SIZE:
+                # Hash the rest straight from the page cache, without
+                # copying it into Python bytes objects
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    with memoryview(mm) as view, view[_HASH_CHUNK_SIZE:] as rest:
+                        hasher.update(rest)
+        return str(hasher.hexdigest())
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _directory_signature(directory: str) -> Tuple[int, str]:
+    """
+    Calculate a cheap metadata signature of a directory.
+
+    Only stats files (no reads), using the same filtering rules as
+    `_hash_directory`. Every file's path, size and mtime feed the digest,
+    so renames and files restored with an older mtime are noticed too.
+
+    Args:
+        directory: The directory path to scan
+
+    Returns:
+        Tuple of (max mtime in ns, digest of per-file metadata)
+    """
+    max_mtime_ns = 0
+    records = []
+
+    for entry in _iter_files(directory):
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        records.append(f"{entry.path}\0{st.st_size}\0{st.st_mtime_ns}")
+        if st.st_mtime_ns > max_mtime_ns:
+            max_mtime_ns = st.st_mtime_ns
+
+    # Sort so the digest does not depend on directory listing order
+    records.sort()
+    digest = _new_hasher("\n".join(records).encode("utf-8", "surrogateescape"))
+    return max_mtime_ns, str(digest.hexdigest())
+
+
+def _hash_executor() -> ThreadPoolExecutor:
+    """Return the shared hashing thread pool, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=min(32, (os.cpu_count() or 4) * 2),
+                thread_name_prefix="cache-hash",
+            )
+        return _executor
+
+
+def _hash_directory(directory: str, max_hash_bytes: int) -> str:
+    """
+    Hash the content of all files in a directory.
+
+    Args:
+        directory: The directory path to hash
+        max_hash_bytes: Files larger than this are fingerprinted by size and
+            mtime instead of content
+
+    Returns:
+        The hash value of the directory content
+    """
+    # Collect files first; hashing is done afterwards so it can run
+    # on several threads (hashlib and file reads release the GIL)
+    file_paths: List[Tuple[str, str]] = []
+    # Oversized files are almost never source; fingerprint them by
+    # metadata so they neither get read nor go unnoticed
+    large_files: Dict[str, str] = {}
+
+    for entry in _iter_files(directory):
+        relative_path = os.path.relpath(entry.path, directory)
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        if st.st_size > max_hash_bytes:
+            large_files[relative_path] = f"{st.st_size}-{st.st_mtime_ns}"
+        else:
+            file_paths.append((relative_path, entry.path))
+
+    paths = [file_path for _, file_path in file_paths]
+
+    if len(paths) < _PARALLEL_HASH_MIN_FILES:
+        digests = [_hash_file(path) for path in paths]
+    else:
+        digests = list(_hash_executor().map(_hash_file, paths))
+
+    digest_by_path = dict(
+        zip((relative_path for relative_path, _ in file_paths), digests)
+    )
+    digest_by_path.update(large_files)
+
+    # Skip files that cannot be read; sort for a deterministic hash
+    # regardless of traversal order
+    file_hashes = [
+        f"{relative_path}:{digest_by_path[relative_path]}"
+        for relative_path in sorted(digest_by_path)
+        if digest_by_path[relative_path] is not None
+    ]
+
+    # Generate directory hash based on all file hashes
+    combined = "|".join(file_hashes)
+    return str(_new_hasher(combined.encode("utf-8")).hexdigest())
+
+
+@functools.lru_cache(maxsize=64)
+def _dir_hash(directory: str, signature: Tuple[int, str], max_hash_bytes: int) -> str:
+    """
+    Memoized `_hash_directory`, keyed by the directory's metadata signature.
+
+    A call with an unchanged signature (e.g. the `set` that follows a `get`
+    in the same request) returns without reading any file.
+    """
+    return _hash_directory(directory, max_hash_bytes)
+
+
+def _seed_hasher(*fields: str) -> "hashlib._Hash":
+    """SHA-256 state after the given fields, each followed by a separator."""
+    # An ASCII unit separator after each field keeps adjacent fields from
+    # running together
+    hasher = hashlib.sha256()
+    for field in fields:
+        hasher.update(field.encode("utf-8"))
+        hasher.update(b"\x1f")
+    return hasher
+
+
+class _CacheEntry:
+    """A single cached result; slotted to keep per-entry overhead small."""
+
+    __slots__ = ("result", "timestamp", "params_key", "task_description")
+
+    def __init__(
+        self, result: Any, timestamp: float, params_key: str, task_description: str
+    ) -> None:
+        self.result = result
+        # time.monotonic() at insertion, so TTL math survives clock jumps
+        self.timestamp = timestamp
+        self.params_key = params_key
+        self.task_description = task_description
 
 
 class ResultCache:
@@ -19,19 +293,174 @@ class ResultCache:
     Uses task description, file content hash, and execution parameters to
     generate cache keys,
     avoiding duplicate execution of same Codex tasks.
+
+    Eviction is least-recently-used: the OrderedDict is kept in access
+    order, hits and re-stores move an entry to the back, and the head is
+    evicted when the cache is full, all in O(1). TTL bounds how long any
+    entry lives, counted from when it was stored.
     """
 
-    def __init__(self, ttl: int = 3600, max_size: int = 100):
+    def __init__(
+        self,
+        ttl: int = 3600,
+        max_size: int = 100,
+        max_hash_bytes: int = 10 * 1024 * 1024,
+        persist_path: Optional[str] = None,
+    ):
         """
         Initialize cache.
 
         Args:
             ttl: Cache time-to-live in seconds, default 1 hour
             max_size: Maximum cache entries, default 100
+            max_hash_bytes: Files larger than this are fingerprinted by size
+                and mtime instead of content, default 10 MiB
+            persist_path: SQLite file used to keep entries across restarts,
+                default None (memory only)
         """
-        self.cache: Dict[str, Dict[str, Any]] = {}
+        self.cache: "OrderedDict[str, _CacheEntry]" = OrderedDict()
         self.ttl = ttl
         self.max_size = max_size
+        self.max_hash_bytes = max_hash_bytes
+        # params key (cache key without files hash) -> full cache keys, so
+        # lookups for never-seen task parameters skip the directory walk
+        self._params_index: Dict[str, List[str]] = {}
+        # Guards self.cache; never held across filesystem access
+        self._lock = threading.RLock()
+        # Running count of entries dropped because their TTL had passed
+        self._expired_evictions = 0
+        # Min-heap of (timestamp, key) in store order. Items are not removed
+        # when an entry is evicted or re-stored; they are skipped once their
+        # timestamp no longer matches the live entry (lazy deletion).
+        self._ttl_heap: List[Tuple[float, str]] = []
+        # (directory, files hash) -> key hasher already fed those two fields
+        self._key_seeds: Dict[Tuple[str, str], "hashlib._Hash"] = {}
+        # Directory hashes running for async lookups, so concurrent lookups
+        # in the same directory share one walk
+        self._pending_hashes: Dict[Tuple[str, bool], "asyncio.Future[str]"] = {}
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if persist_path is not None:
+            self._db = self._open_store(persist_path)
+            self._load_persisted()
+
+    @staticmethod
+    def _open_store(persist_path: str) -> sqlite3.Connection:
+        """Open (creating if needed) the SQLite file backing the cache."""
+        conn = sqlite3.connect(persist_path, check_same_thread=False)
+        # The cache is rebuildable, so trade durability for write speed
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, "
+            "params_key TEXT NOT NULL, "
+            "result TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "task_description TEXT NOT NULL)"
+        )
+        conn.commit()
+        return conn
+
+    def _load_persisted(self) -> None:
+        """Load unexpired entries from the persistent store, oldest first."""
+        wall_now = time.time()
+        monotonic_now = time.monotonic()
+        with self._db_lock:
+            if self._db is None:
+                return
+            rows = self._db.execute(
+                "SELECT key, params_key, result, created_at, task_description "
+                "FROM cache WHERE created_at > ? ORDER BY created_at DESC LIMIT ?",
+                (wall_now - self.ttl, self.max_size),
+            ).fetchall()
+
+        for key, params_key, result, created_at, task_description in reversed(rows):
+            try:
+                value = json.loads(result)
+            except ValueError:
+                continue
+            # Stored times are wall clock; translate the age to monotonic time
+            timestamp = monotonic_now - (wall_now - created_at)
+            self._insert(
+                key, _CacheEntry(value, timestamp, params_key, task_description)
+            )
+
+    def _persist(self, cache_key: str, entry: _CacheEntry) -> None:
+        """Write an entry to the persistent store; failures are ignored."""
+        if self._db is None:
+            return
+        created_at = time.time() - (time.monotonic() - entry.timestamp)
+        try:
+            with self._db_lock:
+                # close() may have run since the check above
+                if self._db is None:
+                    return
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache "
+                    "(key, params_key, result, created_at, task_description) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        cache_key,
+                        entry.params_key,
+                        json.dumps(entry.result, ensure_ascii=False),
+                        created_at,
+                        entry.task_description,
+                    ),
+                )
+                self._db.commit()
+        except (sqlite3.Error, TypeError, ValueError):
+            # Persistence is best effort; the in-memory cache stays valid
+            pass
+
+    def _prune_persisted(self, clear_all: bool = False) -> None:
+        """Delete expired (or all) rows from the persistent store."""
+        if self._db is None:
+            return
+        try:
+            with self._db_lock:
+                if self._db is None:
+                    return
+                if clear_all:
+                    self._db.execute("DELETE FROM cache")
+                else:
+                    self._db.execute(
+                        "DELETE FROM cache WHERE created_at <= ?",
+                        (time.time() - self.ttl,),
+                    )
+                self._db.commit()
+        except sqlite3.Error:
+            pass
+
+    def close(self) -> None:
+        """Close the persistent store; the in-memory cache keeps working."""
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def make_key(
+        self,
+        task_description: str,
+        working_directory: str,
+        execution_mode: str,
+        sandbox_mode: str,
+        output_format: str,
+    ) -> str:
+        """
+        Generate a key for the request parameters alone.
+
+        Unlike the cache key, this does not depend on directory contents, so
+        it is cheap enough to identify identical requests that are in flight.
+        """
+        return self._generate_cache_key(
+            task_description,
+            working_directory,
+            execution_mode,
+            sandbox_mode,
+            output_format,
+        )
 
     def _generate_cache_key(
         self,
@@ -58,74 +487,145 @@ class ResultCache:
         Returns:
             Generated cache key
         """
-        # Build cache key string
-        cache_data = {
-            "task": task_description,
-            "directory": working_directory,
-            "exec_mode": execution_mode,
-            "sandbox_mode": sandbox_mode,
-            "output_format": output_format,
-            "files_hash": files_hash or "none",
-        }
-
-        # Serialize to JSON string (ensuring consistent order)
-        cache_string = json.dumps(cache_data, sort_keys=True)
-
-        # Generate SHA256 hash
-        return hashlib.sha256(cache_string.encode("utf-8")).hexdigest()
-
-    def _calculate_directory_hash(self, directory: str) -> str:
+        # The directory and its hash rarely change within a session, so the
+        # hasher state after them is kept and copied instead of re-hashed
+        seed_key = (working_directory, files_hash or "none")
+        seed = self._key_seeds.get(seed_key)
+        if seed is None:
+            seed = _seed_hasher(*seed_key)
+            if len(self._key_seeds) >= _KEY_SEEDS_MAX:
+                self._key_seeds.clear()
+            self._key_seeds[seed_key] = seed
+
+        hasher = seed.copy()
+        for field in (task_description, execution_mode, sandbox_mode, output_format):
+            hasher.update(field.encode("utf-8"))
+            hasher.update(b"\x1f")
+
+        return hasher.hexdigest()
+
+    def _calculate_directory_hash(
+        self, directory: str, metadata_only: bool = False
+    ) -> str:
         """
         Calculate the content hash of all files in a directory.
 
         Args:
             directory: The directory path to calculate the hash for
+            metadata_only: Fingerprint files by path, size and mtime without
+                reading them. Used for read-only runs, where Codex cannot
+                change the files, so only outside edits need to invalidate.
 
         Returns:
             The hash value of the directory content
         """
         try:
-            file_hashes = []
-
-            # Iterate over all files in the directory
-            for root, dirs, files in os.walk(directory):
-                # Skip hidden directories and common ignored directories
-                dirs[:] = [
-                    d
-                    for d in dirs
-                    if not d.startswith(".")
-                    and d not in ["node_modules", "__pycache__", ".git"]
-                ]
+            # Skip re-reading every file when no file metadata has changed
+            signature = _directory_signature(directory)
+            if metadata_only:
+                # Not memoized, so the racy window below does not apply
+                return f"meta:{signature[1]}"
+            if signature[0] >= time.time_ns() - _RACY_WINDOW_NS:
+                return _hash_directory(directory, self.max_hash_bytes)
+            return _dir_hash(directory, signature, self.max_hash_bytes)
 
-                for file in sorted(files):
-                    # Skip hidden files and binary files
-                    if file.startswith(".") or file.endswith(
-                        (".pyc", ".so", ".exe", ".bin")
-                    ):
-                        continue
+        except Exception:
+            # If calculation fails, return a timestamp as a fallback
+            return str(int(time.time()))
 
-                    file_path = os.path.join(root, file)
+    def _may_contain(self, params_key: str) -> bool:
+        """
+        Check whether any entry was stored for the given task parameters.
 
-                    try:
-                        # Read file content and calculate hash
-                        with open(file_path, "rb") as f:
-                            file_content = f.read()
-                            file_hash = hashlib.md5(
-                                file_content, usedforsecurity=False
-                            ).hexdigest()  # noqa: S324
-                            relative_path = os.path.relpath(file_path, directory)
-                            file_hashes.append(f"{relative_path}:{file_hash}")
-                    except (IOError, OSError):
-                        # Skip files that cannot be read
-                        continue
+        Parameters never stored before cannot hit, whatever the files are,
+        so a False here lets lookups skip the directory walk entirely.
 
-            # Generate directory hash based on all file hashes
-            combined = "|".join(file_hashes)
-            return hashlib.sha256(combined.encode("utf-8")).hexdigest()
+        Args:
+            params_key: Cache key generated without a files hash
 
-        except Exception:
-            # If calculation fails, return a timestamp as a fallback
-            return str(int(time.time()))
+        Returns:
+            False if nothing is cached for these parameters
+        """
+        with self._lock:
+            return params_key in self._params_index
+
+    def _lookup(self, cache_key: str) -> Any:
+        """Return the unexpired result stored under cache_key, if any."""
+        with self._lock:
+            # Check if cache exists
+            cache_entry = self.cache.get(cache_key)
+            if cache_entry is None:
+                return None
+
+            # Check if expired
+            if time.monotonic() - cache_entry.timestamp > self.ttl:
+                # Delete expired entry
+                self._discard(cache_key)
+                self._expired_evictions += 1
+                return None
+
+            # Mark as most recently used
+            self.cache.move_to_end(cache_key)
+            return cache_entry.result
+
+    def _store(
+        self,
+        params_key: str,
+        cache_key: str,
+        task_description: str,
+        result: Any,
+        persist: bool = True,
+    ) -> _CacheEntry:
+        """
+        Insert a result under precomputed keys, evicting as needed.
+
+        With persist=False the caller writes the returned entry to the
+        persistent store itself (the async API does so off the event loop).
+        """
+        current_time = time.monotonic()
+        entry = _CacheEntry(
+            result,
+            current_time,
+            params_key,
+            (
+                task_description[:100] + "..."
+                if len(task_description) > 100
+                else task_description
+            ),
+        )
+
+        self._insert(cache_key, entry)
+        if persist:
+            self._persist(cache_key, entry)
+        return entry
+
+    async def _store_async(
+        self, params_key: str, cache_key: str, task_description: str, result: Any
+    ) -> None:
+        """`_store` with the JSON encoding and SQLite write run in a thread."""
+        entry = self._store(
+            params_key, cache_key, task_description, result, persist=False
+        )
+        if self._db is not None:
+            await asyncio.to_thread(self._persist, cache_key, entry)
+
+    def _insert(self, cache_key: str, entry: _CacheEntry) -> None:
+        """Add an entry to the in-memory cache and its indexes."""
+        with self._lock:
+            # Re-inserting an existing key must not evict another entry
+            self._discard(cache_key)
+
+            # Only entries at the top of the TTL heap can have expired, so
+            # this amortized cleanup pops just those
+            self._expire_due(time.monotonic())
+
+            # If cache is full, delete the least recently used entry
+            if len(self.cache) >= self.max_size:
+                self._evict_oldest()
+
+            self.cache[cache_key] = entry
+            self._push_ttl(cache_key, entry)
+            self._params_index.setdefault(entry.params_key, []).append(cache_key)
 
     def get(
         self,
@@ -134,7 +634,7 @@ class ResultCache:
         execution_mode: str,
         sandbox_mode: str,
         output_format: str,
-    ) -> Optional[str]:
+    ) -> Any:
         """
         Get result from cache.
 
@@ -146,10 +646,22 @@ class ResultCache:
             output_format: Output format
 
         Returns:
-            Cached result (JSON string), or None if it does not exist
+            Cached result dict, or None if it does not exist
         """
+        params_key = self._generate_cache_key(
+            task_description,
+            working_directory,
+            execution_mode,
+            sandbox_mode,
+            output_format,
+        )
+        if not self._may_contain(params_key):
+            return None
+
         # Calculate file hash (to detect file changes)
-        files_hash = self._calculate_directory_hash(working_directory)
+        files_hash = self._calculate_directory_hash(
+            working_directory, sandbox_mode == "read-only"
+        )
 
         # Generate cache key
         cache_key = self._generate_cache_key(
@@ -161,22 +673,7 @@ class ResultCache:
             files_hash,
         )
 
-        # Check if cache exists
-        if cache_key not in self.cache:
-            return None
-
-        cache_entry = self.cache[cache_key]
-
-        # Check if expired
-        if time.time() - cache_entry["timestamp"] > self.ttl:
-            # Delete expired entry
-            del self.cache[cache_key]
-            return None
-
-        # Update access time (LRU)
-        cache_entry["last_accessed"] = time.time()
-
-        return str(cache_entry["result"])
+        return self._lookup(cache_key)
 
     def set(
         self,
@@ -185,7 +682,7 @@ class ResultCache:
         execution_mode: str,
         sandbox_mode: str,
         output_format: str,
-        result: str,
+        result: Any,
     ) -> None:
         """
         Store result in cache.
@@ -196,12 +693,21 @@ class ResultCache:
             execution_mode: Execution mode
             sandbox_mode: Sandbox mode
             output_format: Output format
-            result: The result to be cached (JSON string)
+            result: The result to be cached (JSON-serializable dict)
         """
         # Calculate file hash
-        files_hash = self._calculate_directory_hash(working_directory)
+        files_hash = self._calculate_directory_hash(
+            working_directory, sandbox_mode == "read-only"
+        )
 
         # Generate cache key
+        params_key = self._generate_cache_key(
+            task_description,
+            working_directory,
+            execution_mode,
+            sandbox_mode,
+            output_format,
+        )
         cache_key = self._generate_cache_key(
             task_description,
             working_directory,
@@ -211,38 +717,211 @@ class ResultCache:
             files_hash,
         )
 
-        # If cache is full, delete the oldest entry (LRU)
-        if len(self.cache) >= self.max_size:
-            self._evict_oldest()
-
-        # Store in cache
-        current_time = time.time()
-        self.cache[cache_key] = {
-            "result": result,
-            "timestamp": current_time,
-            "last_accessed": current_time,
-            "task_description": (
-                task_description[:100] + "..."
-                if len(task_description) > 100
-                else task_description
-            ),
-        }
+        self._store(params_key, cache_key, task_description, result)
 
-    def _evict_oldest(self) -> None:
-        """Delete the least recently used cache entry (LRU policy)."""
-        if not self.cache:
-            return
+    async def _calculate_directory_hash_async(
+        self, directory: str, metadata_only: bool = False, share: bool = False
+    ) -> str:
+        """
+        Calculate the directory hash without blocking the event loop.
+
+        The walk and file reads run in a worker thread; files are still
+        hashed in parallel by `_calculate_directory_hash` itself.
+
+        Args:
+            directory: The directory path to calculate the hash for
+            metadata_only: See `_calculate_directory_hash`
+            share: Join a hash of the same directory that is already running
+                instead of starting another walk. Only used for lookups;
+                stores hash the directory as it is now unless given the
+                lookup's hash.
+
+        Returns:
+            The hash value of the directory content
+        """
+        if not share:
+            return await asyncio.to_thread(
+                self._calculate_directory_hash, directory, metadata_only
+            )
+
+        pending_key = (directory, metadata_only)
+        pending = self._pending_hashes.get(pending_key)
+        if pending is None:
+            pending = asyncio.ensure_future(
+                asyncio.to_thread(
+                    self._calculate_directory_hash, directory, metadata_only
+                )
+            )
+            self._pending_hashes[pending_key] = pending
+            pending.add_done_callback(
+                lambda _: self._pending_hashes.pop(pending_key, None)
+            )
+        # Shield so one cancelled lookup does not cancel the others' hash
+        return await asyncio.shield(pending)
+
+    async def aget(
+        self,
+        task_description: str,
+        working_directory: str,
+        execution_mode: str,
+        sandbox_mode: str,
+        output_format: str,
+    ) -> Any:
+        """
+        Get result from cache, hashing the directory off the event loop.
 
-        # Find the least recently used entry
-        oldest_key = min(
-            self.cache.keys(), key=lambda k: self.cache[k]["last_accessed"]
+        Same arguments and return value as `get`.
+        """
+        result, _ = await self.aget_with_files_hash(
+            task_description,
+            working_directory,
+            execution_mode,
+            sandbox_mode,
+            output_format,
         )
+        return result
 
-        del self.cache[oldest_key]
+    async def aget_with_files_hash(
+        self,
+        task_description: str,
+        working_directory: str,
+        execution_mode: str,
+        sandbox_mode: str,
+        output_format: str,
+    ) -> Tuple[Any, Optional[str]]:
+        """
+        Like `aget`, but also return the directory hash used for the lookup.
+
+        The hash can be passed to `aset` so a miss walks the directory only
+        once. It is None when the task parameters were never stored, since
+        the lookup then skips hashing altogether.
+        """
+        params_key = self._generate_cache_key(
+            task_description,
+            working_directory,
+            execution_mode,
+            sandbox_mode,
+            output_format,
+        )
+        if not self._may_contain(params_key):
+            return None, None
+
+        files_hash = await self._calculate_directory_hash_async(
+            working_directory, sandbox_mode == "read-only", share=True
+        )
+        cache_key = self._generate_cache_key(
+            task_description,
+            working_directory,
+            execution_mode,
+            sandbox_mode,
+            output_format,
+            files_hash,
+        )
+
+        return self._lookup(cache_key), files_hash
+
+    async def aset(
+        self,
+        task_description: str,
+        working_directory: str,
+        execution_mode: str,
+        sandbox_mode: str,
+        output_format: str,
+        result: Any,
+        files_hash: Optional[str] = None,
+    ) -> None:
+        """
+        Store result in cache, hashing the directory off the event loop.
+
+        Same arguments as `set`, plus:
+
+        Args:
+            files_hash: Directory hash from `aget_with_files_hash`, reused
+                instead of walking the directory again. Only valid if the
+                files cannot have changed since the lookup.
+        """
+        if files_hash is None:
+            files_hash = await self._calculate_directory_hash_async(
+                working_directory, sandbox_mode == "read-only"
+            )
+        params_key = self._generate_cache_key(
+            task_description,
+            working_directory,
+            execution_mode,
+            sandbox_mode,
+            output_format,
+        )
+        cache_key = self._generate_cache_key(
+            task_description,
+            working_directory,
+            execution_mode,
+            sandbox_mode,
+            output_format,
+            files_hash,
+        )
+
+        await self._store_async(params_key, cache_key, task_description, result)
+
+    def _discard(self, cache_key: str) -> None:
+        """Remove an entry, if present, along with its params index record."""
+        with self._lock:
+            entry = self.cache.pop(cache_key, None)
+            if entry is None:
+                return
+
+            params_key = entry.params_key
+            keys = self._params_index.get(params_key)
+            if keys is not None:
+                keys.remove(cache_key)
+                if not keys:
+                    del self._params_index[params_key]
+
+    def _is_current(self, item: Tuple[float, str]) -> bool:
+        """Whether a TTL heap item still describes a live cache entry."""
+        entry = self.cache.get(item[1])
+        return entry is not None and entry.timestamp == item[0]
+
+    def _push_ttl(self, cache_key: str, entry: _CacheEntry) -> None:
+        """Record an entry in the TTL heap, compacting stale items if needed."""
+        with self._lock:
+            heapq.heappush(self._ttl_heap, (entry.timestamp, cache_key))
+            if len(self._ttl_heap) > 2 * len(self.cache) + 64:
+                self._ttl_heap = [
+                    (live.timestamp, key) for key, live in self.cache.items()
+                ]
+                heapq.heapify(self._ttl_heap)
+
+    def _expire_due(self, current_time: float) -> int:
+        """Drop entries whose TTL has passed, popping only due heap items."""
+        cutoff = current_time - self.ttl
+        removed = 0
+        with self._lock:
+            heap = self._ttl_heap
+            while heap and heap[0][0] < cutoff:
+                item = heapq.heappop(heap)
+                if self._is_current(item):
+                    self._discard(item[1])
+                    removed += 1
+            self._expired_evictions += removed
+        return removed
+
+    def _evict_oldest(self) -> None:
+        """Delete the least recently used cache entry (LRU policy)."""
+        with self._lock:
+            if not self.cache:
+                return
+
+            # Entries are kept in access order, so the head is the LRU one
+            self._discard(next(iter(self.cache)))
 
     def clear(self) -> None:
         """Clear all cache."""
-        self.cache.clear()
+        with self._lock:
+            self.cache.clear()
+            self._params_index.clear()
+            self._ttl_heap.clear()
+            _dir_hash.cache_clear()
+        self._prune_persisted(clear_all=True)
 
     def get_stats(self) -> Dict[str, Any]:
         """
@@ -251,36 +930,55 @@ class ResultCache:
         Returns:
             A dictionary containing cache statistics
         """
-        current_time = time.time()
-        expired_count = sum(
-            1
-            for entry in self.cache.values()
-            if current_time - entry["timestamp"] > self.ttl
-        )
-
-        return {
-            "total_entries": len(self.cache),
-            "expired_entries": expired_count,
-            "active_entries": len(self.cache) - expired_count,
-            "max_size": self.max_size,
-            "ttl_seconds": self.ttl,
-            "oldest_entry_age": (
-                current_time - min(entry["timestamp"] for entry in self.cache.values())
-                if self.cache
-                else 0
-            ),
-        }
+        current_time = time.monotonic()
+        with self._lock:
+            heap = self._ttl_heap
+            while heap and not self._is_current(heap[0]):
+                heapq.heappop(heap)
+
+            # Walk only the part of the heap that is past the cutoff; a
+            # node's children are never older than the node itself
+            cutoff = current_time - self.ttl
+            expired_count = 0
+            pending = [0] if heap else []
+            while pending:
+                index = pending.pop()
+                if index >= len(heap) or heap[index][0] >= cutoff:
+                    continue
+                if self._is_current(heap[index]):
+                    expired_count += 1
+                pending.extend((2 * index + 1, 2 * index + 2))
+
+            return {
+                "total_entries": len(self.cache),
+                "expired_entries": expired_count,
+                "active_entries": len(self.cache) - expired_count,
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "expired_evictions": self._expired_evictions,
+                "oldest_entry_age": current_time - heap[0][0] if heap else 0,
+            }
 
     def cleanup_expired(self) -> int:
-        """Clean up expired cache entries."""
-        current_time = time.time()
-        expired_keys = [
-            key
-            for key, entry in self.cache.items()
-            if current_time - entry["timestamp"] > self.ttl
-        ]
-
-        for key in expired_keys:
-            del self.cache[key]
-
-        return len(expired_keys)
+        """
+        Clean up expired cache entries.
+
+        Not needed on the hot path: get() drops expired entries it finds and
+        set() pops due entries off the TTL heap. This runs the same heap
+        drain as an explicit maintenance operation, in O(k log n) for k
+        expired entries.
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock:
+            size_before = len(self.cache)
+            removed = self._expire_due(time.monotonic())
+
+            if removed > size_before // 4:
+                # Dicts do not shrink on deletion; copying into a freshly
+                # sized table releases the memory after a large expiry
+                self.cache = OrderedDict(self.cache)
+
+        self._prune_persisted()
+        return removed
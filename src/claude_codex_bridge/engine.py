@@ -5,6 +5,10 @@ Responsible for analyzing tasks and deciding whether and how to delegate to Code
 """
 
 import os
+import stat
+
+# Sensitive system directories Codex must never be pointed at
+_DANGEROUS_PREFIXES = ("/etc", "/usr/bin", "/bin", "/sbin", "/root")
 
 
 class DelegationDecisionEngine:
@@ -64,20 +68,17 @@ class DelegationDecisionEngine:
         if not os.path.isabs(directory):
             return False
 
-        # Ensure the directory exists
-        if not os.path.exists(directory):
+        # Ensure the directory exists and is a directory, with a single stat
+        try:
+            st = os.stat(directory)
+        except (OSError, ValueError):
             return False
-
-        # Ensure it is a directory and not a file
-        if not os.path.isdir(directory):
+        if not stat.S_ISDIR(st.st_mode):
             return False
 
         # Basic security check - prevent access to sensitive system directories
-        dangerous_paths = ["/etc", "/usr/bin", "/bin", "/sbin", "/root"]
         normalized_path = os.path.normpath(directory)
-
-        for dangerous in dangerous_paths:
-            if normalized_path.startswith(dangerous):
-                return False
+        if normalized_path.startswith(_DANGEROUS_PREFIXES):
+            return False
 
         return True
@@ -2,15 +2,18 @@
 测试缓存模块的单元测试
 """
 
+import asyncio
 import os
-import sys
 import tempfile
+import threading
 import time
 import unittest
+from unittest.mock import patch
 
-# Must be before imports from src
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
-from claude_codex_bridge.cache import ResultCache  # noqa: E402
+import pytest
+
+from claude_codex_bridge import cache as cache_module
+from claude_codex_bridge.cache import ResultCache
 
 
 class TestResultCache(unittest.TestCase):
@@ -27,6 +30,12 @@ class TestResultCache(unittest.TestCase):
         with open(os.path.join(self.temp_dir, "test.py"), "w") as f:
             f.write("print('hello world')")
 
+    def _set_in_past(self, cache, *args):
+        """在 TTL 之前的时间点写入条目，使其已经过期"""
+        past = time.monotonic() - cache.ttl - 1
+        with patch.object(cache_module.time, "monotonic", return_value=past):
+            cache.set(*args)
+
     def test_cache_key_generation(self):
         """测试缓存键生成"""
         key1 = self.cache._generate_cache_key(
@@ -48,6 +57,35 @@ class TestResultCache(unittest.TestCase):
         # 键应该是固定长度的哈希值
         self.assertEqual(len(key1), 64)  # SHA256 产生 64 字符的十六进制字符串
 
+        # 字段边界不同的参数不应生成相同键
+        key4 = self.cache._generate_cache_key("ab", "c", "mode1", "sandbox1", "f")
+        key5 = self.cache._generate_cache_key("a", "bc", "mode1", "sandbox1", "f")
+        self.assertNotEqual(key4, key5)
+
+        # 未提供文件哈希与提供文件哈希的键应不同
+        key6 = self.cache._generate_cache_key(
+            "task1", "/dir1", "mode1", "sandbox1", "format1"
+        )
+        self.assertNotEqual(key1, key6)
+
+    def test_cache_key_reuses_directory_seed(self):
+        """测试同一目录状态的缓存键复用预先计算的哈希前缀"""
+        key1 = self.cache._generate_cache_key(
+            "task one", "/tmp", "mode", "sandbox", "format", "abc"
+        )
+        key2 = self.cache._generate_cache_key(
+            "task two", "/tmp", "mode", "sandbox", "format", "abc"
+        )
+        self.assertNotEqual(key1, key2)
+        self.assertEqual(len(self.cache._key_seeds), 1)
+
+        self.assertEqual(
+            ResultCache()._generate_cache_key(
+                "task one", "/tmp", "mode", "sandbox", "format", "abc"
+            ),
+            key1,
+        )
+
     def test_directory_hash_calculation(self):
         """测试目录哈希计算"""
         hash1 = self.cache._calculate_directory_hash(self.temp_dir)
@@ -65,6 +103,143 @@ class TestResultCache(unittest.TestCase):
         # 修改后应产生不同哈希
         self.assertNotEqual(hash1, hash3)
 
+    def test_read_only_hash_uses_metadata(self):
+        """测试只读模式下目录指纹只使用文件元数据，不读取文件内容"""
+        file_path = os.path.join(self.temp_dir, "test.py")
+        old_time = time.time() - 60
+        os.utime(file_path, (old_time, old_time))
+
+        with patch.object(cache_module, "_hash_file") as mock_hash_file:
+            hash1 = self.cache._calculate_directory_hash(self.temp_dir, True)
+            mock_hash_file.assert_not_called()
+
+        # 外部修改仍会改变指纹
+        with open(file_path, "a") as f:
+            f.write("\n# modified")
+        os.utime(file_path, (old_time + 1, old_time + 1))
+        self.assertNotEqual(
+            self.cache._calculate_directory_hash(self.temp_dir, True), hash1
+        )
+
+    def test_read_only_hash_skips_content_for_fresh_files(self):
+        """测试只读模式下刚写入的文件也不读取内容，且指纹保持稳定"""
+        with patch.object(cache_module, "_hash_file") as mock_hash_file:
+            hash1 = self.cache._calculate_directory_hash(self.temp_dir, True)
+            hash2 = self.cache._calculate_directory_hash(self.temp_dir, True)
+            mock_hash_file.assert_not_called()
+
+        self.assertTrue(hash1.startswith("meta:"))
+        self.assertEqual(hash1, hash2)
+
+    def test_directory_hash_memoized_by_signature(self):
+        """测试文件元数据未变化时复用目录哈希"""
+        file_path = os.path.join(self.temp_dir, "test.py")
+        old_time = time.time() - 60
+        os.utime(file_path, (old_time, old_time))
+
+        hash1 = self.cache._calculate_directory_hash(self.temp_dir)
+
+        # 相同大小、相同 mtime 的改写不会触发重新读取文件
+        with open(file_path, "w") as f:
+            f.write("print('HELLO WORLD')")
+        os.utime(file_path, (old_time, old_time))
+        self.assertEqual(self.cache._calculate_directory_hash(self.temp_dir), hash1)
+
+        # mtime 变化后应重新计算
+        os.utime(file_path, (old_time + 1, old_time + 1))
+        self.assertNotEqual(self.cache._calculate_directory_hash(self.temp_dir), hash1)
+
+    def test_directory_signature_notices_renames(self):
+        """测试重命名文件（大小和 mtime 不变）也会改变目录签名"""
+        file_path = os.path.join(self.temp_dir, "test.py")
+        old_time = time.time() - 60
+        os.utime(file_path, (old_time, old_time))
+
+        hash1 = self.cache._calculate_directory_hash(self.temp_dir)
+        os.rename(file_path, os.path.join(self.temp_dir, "renamed.py"))
+        self.assertNotEqual(self.cache._calculate_directory_hash(self.temp_dir), hash1)
+
+    def test_hash_file_matches_content_digest(self):
+        """测试大于单次读取块的文件（mmap 路径）哈希与整体内容一致"""
+        file_path = os.path.join(self.temp_dir, "big.txt")
+        data = b"0123456789" * 10
+        with open(file_path, "wb") as f:
+            f.write(data)
+
+        expected = cache_module._new_hasher(data).hexdigest()
+        for chunk_size in (7, 100, 4096):
+            with patch.object(cache_module, "_HASH_CHUNK_SIZE", chunk_size):
+                self.assertEqual(cache_module._hash_file(file_path), expected)
+
+    def test_directory_hash_parallel_matches_serial(self):
+        """测试并行哈希与串行哈希结果一致"""
+        for i in range(12):
+            with open(os.path.join(self.temp_dir, f"file_{i}.py"), "w") as f:
+                f.write(f"value = {i}")
+
+        parallel_hash = ResultCache()._calculate_directory_hash(self.temp_dir)
+
+        with patch.object(cache_module, "_PARALLEL_HASH_MIN_FILES", 1000):
+            serial_hash = ResultCache()._calculate_directory_hash(self.temp_dir)
+
+        self.assertEqual(parallel_hash, serial_hash)
+
+    def test_hash_executor_is_shared(self):
+        """测试哈希线程池在多次调用间复用"""
+        self.assertIs(cache_module._hash_executor(), cache_module._hash_executor())
+
+    def test_directory_hash_skips_ignored_entries(self):
+        """测试隐藏文件、忽略目录和二进制文件不影响目录哈希"""
+        hash1 = self.cache._calculate_directory_hash(self.temp_dir)
+
+        os.makedirs(os.path.join(self.temp_dir, "node_modules"))
+        with open(os.path.join(self.temp_dir, "node_modules", "lib.js"), "w") as f:
+            f.write("module.exports = {}")
+        os.makedirs(os.path.join(self.temp_dir, "dist"))
+        with open(os.path.join(self.temp_dir, "dist", "app.py"), "w") as f:
+            f.write("built = True")
+        with open(os.path.join(self.temp_dir, ".env"), "w") as f:
+            f.write("SECRET=1")
+        with open(os.path.join(self.temp_dir, "module.pyc"), "wb") as f:
+            f.write(b"\x00\x01")
+
+        self.assertEqual(ResultCache()._calculate_directory_hash(self.temp_dir), hash1)
+
+    @unittest.skipIf(cache_module.pathspec is None, "pathspec not installed")
+    def test_directory_hash_honours_gitignore(self):
+        """测试 .gitignore 中忽略的文件和目录不影响目录哈希"""
+        with open(os.path.join(self.temp_dir, ".gitignore"), "w") as f:
+            f.write("*.log\nout/\n")
+        hash1 = ResultCache()._calculate_directory_hash(self.temp_dir)
+
+        os.makedirs(os.path.join(self.temp_dir, "out"))
+        with open(os.path.join(self.temp_dir, "out", "bundle.js"), "w") as f:
+            f.write("bundle")
+        with open(os.path.join(self.temp_dir, "debug.log"), "w") as f:
+            f.write("log line")
+
+        self.assertEqual(ResultCache()._calculate_directory_hash(self.temp_dir), hash1)
+
+    def test_directory_hash_large_files_not_read(self):
+        """测试超过大小上限的文件按元数据而非内容计算哈希"""
+        capped_cache = ResultCache(max_hash_bytes=16)
+        big_file = os.path.join(self.temp_dir, "data.txt")
+        with open(big_file, "w") as f:
+            f.write("a" * 64)
+
+        with patch.object(cache_module, "_hash_file", wraps=cache_module._hash_file):
+            hash1 = capped_cache._calculate_directory_hash(self.temp_dir)
+            hashed_paths = [c.args[0] for c in cache_module._hash_file.call_args_list]
+
+        self.assertNotIn(big_file, hashed_paths)
+
+        # 大文件的大小变化仍会使哈希失效
+        with open(big_file, "a") as f:
+            f.write("b")
+        self.assertNotEqual(
+            capped_cache._calculate_directory_hash(self.temp_dir), hash1
+        )
+
     def test_cache_set_and_get(self):
         """测试缓存存储和获取"""
         # 设置缓存
@@ -80,6 +255,117 @@ class TestResultCache(unittest.TestCase):
         result = self.cache.get("task2", self.temp_dir, "mode1", "sandbox1", "format1")
         self.assertIsNone(result)
 
+    def test_cache_miss_skips_directory_hash_for_unknown_params(self):
+        """测试从未缓存过的参数组合不会计算目录哈希"""
+        with patch.object(self.cache, "_calculate_directory_hash") as mock_hash:
+            result = self.cache.get(
+                "task1", self.temp_dir, "mode1", "sandbox1", "format1"
+            )
+
+        self.assertIsNone(result)
+        mock_hash.assert_not_called()
+
+    def test_cache_params_index_follows_eviction(self):
+        """测试驱逐和清空时参数索引同步更新"""
+        small_cache = ResultCache(ttl=3600, max_size=1)
+        small_cache.set(
+            "task1", self.temp_dir, "mode1", "sandbox1", "format1", "result1"
+        )
+        small_cache.set(
+            "task2", self.temp_dir, "mode2", "sandbox1", "format1", "result2"
+        )
+        self.assertEqual(len(small_cache._params_index), 1)
+
+        small_cache.clear()
+        self.assertEqual(small_cache._params_index, {})
+
+    def test_async_cache_set_and_get(self):
+        """测试异步接口与同步接口共享同一缓存"""
+
+        async def run():
+            await self.cache.aset(
+                "task1", self.temp_dir, "mode1", "sandbox1", "format1", "result1"
+            )
+            return await self.cache.aget(
+                "task1", self.temp_dir, "mode1", "sandbox1", "format1"
+            )
+
+        self.assertEqual(asyncio.run(run()), "result1")
+        result = self.cache.get("task1", self.temp_dir, "mode1", "sandbox1", "format1")
+        self.assertEqual(result, "result1")
+
+    def test_async_miss_reuses_lookup_hash(self):
+        """测试未命中时将查询得到的目录哈希传给aset，只计算一次目录哈希"""
+        self.cache.set("task1", self.temp_dir, "mode1", "read-only", "format1", "r1")
+        with open(os.path.join(self.temp_dir, "new.py"), "w") as f:
+            f.write("changed")
+
+        async def run():
+            result, files_hash = await self.cache.aget_with_files_hash(
+                "task1", self.temp_dir, "mode1", "read-only", "format1"
+            )
+            await self.cache.aset(
+                "task1",
+                self.temp_dir,
+                "mode1",
+                "read-only",
+                "format1",
+                "r2",
+                files_hash=files_hash,
+            )
+            return result, files_hash
+
+        with patch.object(
+            self.cache,
+            "_calculate_directory_hash",
+            wraps=self.cache._calculate_directory_hash,
+        ) as mock_hash:
+            result, files_hash = asyncio.run(run())
+
+        self.assertIsNone(result)
+        self.assertIsNotNone(files_hash)
+        self.assertEqual(mock_hash.call_count, 1)
+        self.assertEqual(
+            self.cache.get("task1", self.temp_dir, "mode1", "read-only", "format1"),
+            "r2",
+        )
+
+        # 从未存储过的参数不计算目录哈希
+        self.assertEqual(
+            asyncio.run(
+                self.cache.aget_with_files_hash(
+                    "task2", self.temp_dir, "mode1", "read-only", "format1"
+                )
+            ),
+            (None, None),
+        )
+
+    def test_async_lookups_share_directory_hash(self):
+        """测试并发异步查询同一目录时只计算一次目录哈希"""
+        self.cache.set("task1", self.temp_dir, "mode1", "sandbox1", "format1", "r1")
+
+        async def run():
+            return await asyncio.gather(
+                *(
+                    self.cache.aget(
+                        "task1", self.temp_dir, "mode1", "sandbox1", "format1"
+                    )
+                    for _ in range(4)
+                )
+            )
+
+        with patch.object(
+            self.cache,
+            "_calculate_directory_hash",
+            wraps=self.cache._calculate_directory_hash,
+        ) as mock_hash:
+            results = asyncio.run(run())
+
+        self.assertEqual(results, ["r1"] * 4)
+        self.assertEqual(mock_hash.call_count, 1)
+        self.assertEqual(self.cache._pending_hashes, {})
+
+    @pytest.mark.slow
     def test_cache_expiration(self):
         """测试缓存过期"""
         # 创建短期缓存
@@ -132,6 +418,68 @@ class TestResultCache(unittest.TestCase):
         result = small_cache.get("task3", self.temp_dir, "mode3", "sandbox1", "format1")
         self.assertEqual(result, "result3")
 
+    def test_cache_eviction_is_lru(self):
+        """测试按最近最少使用驱逐，命中和重新写入都会刷新条目"""
+        small_cache = ResultCache(ttl=3600, max_size=2)
+
+        small_cache.set(
+            "task1", self.temp_dir, "mode1", "sandbox1", "format1", "result1"
+        )
+        small_cache.set(
+            "task2", self.temp_dir, "mode2", "sandbox1", "format1", "result2"
+        )
+
+        # 重新写入 task1，使 task2 成为最早插入的条目
+        small_cache.set(
+            "task1", self.temp_dir, "mode1", "sandbox1", "format1", "result1"
+        )
+
+        small_cache.set(
+            "task3", self.temp_dir, "mode3", "sandbox1", "format1", "result3"
+        )
+
+        # task2 应该被驱逐，task1 保留
+        result = small_cache.get("task2", self.temp_dir, "mode2", "sandbox1", "format1")
+        self.assertIsNone(result)
+        result = small_cache.get("task1", self.temp_dir, "mode1", "sandbox1", "format1")
+        self.assertEqual(result, "result1")
+
+        # 命中 task1 后写入 task4，最近最少使用的 task3 应被驱逐
+        small_cache.set(
+            "task4", self.temp_dir, "mode4", "sandbox1", "format1", "result4"
+        )
+        result = small_cache.get("task3", self.temp_dir, "mode3", "sandbox1", "format1")
+        self.assertIsNone(result)
+        result = small_cache.get("task1", self.temp_dir, "mode1", "sandbox1", "format1")
+        self.assertEqual(result, "result1")
+
+    def test_cache_concurrent_access(self):
+        """测试多线程并发读写不会损坏缓存"""
+        small_cache = ResultCache(ttl=3600, max_size=5)
+        errors = []
+
+        def worker(worker_id):
+            try:
+                for i in range(20):
+                    task = f"task{worker_id}-{i}"
+                    small_cache.set(
+                        task, self.temp_dir, "mode1", "sandbox1", "format1", task
+                    )
+                    small_cache.get(task, self.temp_dir, "mode1", "sandbox1", "format1")
+                    small_cache.cleanup_expired()
+                    small_cache.get_stats()
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(small_cache.cache), 5)
+
     def test_cache_stats(self):
         """测试缓存统计"""
         # 添加一些缓存条目
@@ -149,11 +497,83 @@ class TestResultCache(unittest.TestCase):
         self.assertEqual(stats["ttl_seconds"], 3600)
         self.assertGreaterEqual(stats["active_entries"], 0)
 
+    def test_expired_lookup_counts_eviction(self):
+        """测试查询时发现并删除的过期条目也计入 expired_evictions"""
+        self._set_in_past(
+            self.cache, "task1", self.temp_dir, "mode1", "sandbox1", "format1", "r1"
+        )
+
+        self.assertIsNone(
+            self.cache.get("task1", self.temp_dir, "mode1", "sandbox1", "format1")
+        )
+        self.assertEqual(len(self.cache.cache), 0)
+        self.assertEqual(self.cache.get_stats()["expired_evictions"], 1)
+
+    def test_cache_ttl_heap_tracks_expired_entries(self):
+        """测试 TTL 堆统计过期条目，并在写入时清理不在队首的过期条目"""
+        expired_cache = ResultCache(ttl=1, max_size=10)
+        expired_cache.set("task1", self.temp_dir, "mode1", "sandbox1", "format1", "r1")
+        self._set_in_past(
+            expired_cache, "task2", self.temp_dir, "mode2", "sandbox1", "format1", "r2"
+        )
+
+        stats = expired_cache.get_stats()
+        self.assertEqual(stats["expired_entries"], 1)
+        self.assertEqual(stats["active_entries"], 1)
+        self.assertGreater(stats["oldest_entry_age"], 1)
+
+        # 过期条目位于 LRU 队尾，写入时仍应被清理
+        expired_cache.set("task3", self.temp_dir, "mode3", "sandbox1", "format1", "r3")
+        self.assertEqual(len(expired_cache.cache), 2)
+        self.assertEqual(expired_cache.get_stats()["expired_entries"], 0)
+
     def test_cache_cleanup(self):
         """测试缓存清理"""
         # 创建有过期条目的缓存
         expired_cache = ResultCache(ttl=1, max_size=10)
 
+        expired_cache.set(
+            "task3", self.temp_dir, "mode3", "sandbox1", "format1", "result3"
+        )
+        # 另外两个条目在过去写入，已经过期
+        self._set_in_past(
+            expired_cache, "task1", self.temp_dir, "mode1", "sandbox1", "format1", "r1"
+        )
+        self._set_in_past(
+            expired_cache, "task2", self.temp_dir, "mode2", "sandbox1", "format1", "r2"
+        )
+
+        # 清理过期条目
+        cleaned_count = expired_cache.cleanup_expired()
+
+        # 应该清理了2个过期条目
+        self.assertEqual(cleaned_count, 2)
+
+        # 只剩下1个活跃条目
+        self.assertEqual(len(expired_cache.cache), 1)
+        self.assertEqual(len(expired_cache._params_index), 1)
+
+    def test_cache_cleanup_small_batch(self):
+        """测试少量过期条目时逐个删除并同步参数索引"""
+        expired_cache = ResultCache(ttl=1, max_size=10)
+
+        for i in range(1, 5):
+            expired_cache.set(
+                f"task{i}", self.temp_dir, "mode1", "sandbox1", "format1", "result"
+            )
+        self._set_in_past(
+            expired_cache, "task0", self.temp_dir, "mode1", "sandbox1", "format1", "r"
+        )
+
+        self.assertEqual(expired_cache.cleanup_expired(), 1)
+        self.assertEqual(len(expired_cache.cache), 4)
+        self.assertEqual(len(expired_cache._params_index), 4)
+
+    @pytest.mark.slow
+    def test_cache_set_sweeps_expired_entries(self):
+        """测试写入时顺带清理队首的过期条目"""
+        expired_cache = ResultCache(ttl=1, max_size=10)
+
         expired_cache.set(
             "task1", self.temp_dir, "mode1", "sandbox1", "format1", "result1"
         )
@@ -164,19 +584,14 @@ class TestResultCache(unittest.TestCase):
         # 等待过期
         time.sleep(1.1)
 
-        # 添加新的条目（不过期）
+        # 添加新的条目（不过期），过期条目应被顺带清理
         expired_cache.set(
             "task3", self.temp_dir, "mode3", "sandbox1", "format1", "result3"
         )
 
-        # 清理过期条目
-        cleaned_count = expired_cache.cleanup_expired()
-
-        # 应该清理了2个过期条目
-        self.assertEqual(cleaned_count, 2)
-
-        # 只剩下1个活跃条目
         self.assertEqual(len(expired_cache.cache), 1)
+        self.assertEqual(expired_cache.get_stats()["expired_evictions"], 2)
+        self.assertEqual(expired_cache.cleanup_expired(), 0)
 
     def test_cache_clear(self):
         """测试缓存清空"""
@@ -197,6 +612,71 @@ class TestResultCache(unittest.TestCase):
         # 确认已清空
         self.assertEqual(len(self.cache.cache), 0)
 
+    def test_cache_persistence(self):
+        """测试缓存持久化到SQLite后可被新实例加载"""
+        with tempfile.TemporaryDirectory() as db_dir:
+            db_path = os.path.join(db_dir, "cache.db")
+
+            first = ResultCache(ttl=60, max_size=10, persist_path=db_path)
+            first.set("task1", self.temp_dir, "mode1", "sandbox1", "format1", {"r": 1})
+            first.close()
+
+            # 新实例（模拟进程重启）应能命中持久化的条目
+            second = ResultCache(ttl=60, max_size=10, persist_path=db_path)
+            self.assertEqual(
+                second.get("task1", self.temp_dir, "mode1", "sandbox1", "format1"),
+                {"r": 1},
+            )
+
+            # 清空后持久化数据也应被删除
+            second.clear()
+            second.close()
+            third = ResultCache(ttl=60, max_size=10, persist_path=db_path)
+            self.assertEqual(len(third.cache), 0)
+            third.close()
+
+    def test_async_persistence_runs_off_event_loop(self):
+        """测试异步写入在工作线程中持久化，关闭后写入被忽略"""
+        with tempfile.TemporaryDirectory() as db_dir:
+            db_path = os.path.join(db_dir, "cache.db")
+            cache = ResultCache(ttl=60, max_size=10, persist_path=db_path)
+            persist_threads = []
+            original_persist = cache._persist
+
+            def record_persist(cache_key, entry):
+                persist_threads.append(threading.get_ident())
+                original_persist(cache_key, entry)
+
+            cache._persist = record_persist
+
+            async def store():
+                await cache.aset(
+                    "task1", self.temp_dir, "mode1", "sandbox1", "format1", {"r": 1}
+                )
+                return threading.get_ident()
+
+            loop_thread = asyncio.run(store())
+            self.assertEqual(len(persist_threads), 1)
+            self.assertNotEqual(persist_threads[0], loop_thread)
+
+            cache.close()
+            # 关闭后内存缓存仍可用，持久化写入静默跳过
+            cache.set("task2", self.temp_dir, "mode1", "sandbox1", "format1", {"r": 2})
+            self.assertEqual(
+                cache.get("task2", self.temp_dir, "mode1", "sandbox1", "format1"),
+                {"r": 2},
+            )
+
+            reopened = ResultCache(ttl=60, max_size=10, persist_path=db_path)
+            self.assertEqual(
+                reopened.get("task1", self.temp_dir, "mode1", "sandbox1", "format1"),
+                {"r": 1},
+            )
+            self.assertIsNone(
+                reopened.get("task2", self.temp_dir, "mode1", "sandbox1", "format1")
+            )
+            reopened.close()
+
     def tearDown(self):
         """测试后清理"""
         import shutil
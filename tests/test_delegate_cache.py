@@ -0,0 +1,156 @@
+"""
+Tests for how codex_delegate caches results and limits concurrent Codex runs.
+"""
+
+import asyncio
+import json
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import pytest
+
+from claude_codex_bridge import bridge_server
+from claude_codex_bridge.bridge_server import codex_delegate
+from claude_codex_bridge.cache import ResultCache
+
+
+class TestDelegateCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+        for patcher in (
+            patch.object(bridge_server, "result_cache", ResultCache()),
+            patch.object(bridge_server, "_ALLOW_WRITE", False),
+            patch.object(bridge_server.dde, "should_delegate", return_value=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        invoke_patcher = patch.object(
+            bridge_server, "invoke_codex_cli", return_value=(b"analysis output", b"")
+        )
+        self.mock_invoke = invoke_patcher.start()
+        self.addCleanup(invoke_patcher.stop)
+
+    def delegate(self):
+        return json.loads(
+            asyncio.run(
+                codex_delegate(
+                    task_description="Review this project",
+                    working_directory=self.temp_dir.name,
+                    sandbox_mode="read-only",
+                )
+            )
+        )
+
+    def test_miss_stores_dict_and_hit_adds_flags(self):
+        first = self.delegate()
+        self.assertFalse(first["cache_hit"])
+        self.assertNotIn("cache_note", first)
+
+        # The cache holds the result dict itself, not serialized JSON
+        (entry,) = bridge_server.result_cache.cache.values()
+        self.assertIsInstance(entry.result, dict)
+
+        second = self.delegate()
+        self.assertTrue(second["cache_hit"])
+        self.assertIn("cache_note", second)
+        self.assertEqual(second["content"], first["content"])
+        self.assertEqual(self.mock_invoke.call_count, 1)
+
+        # Serving a hit must not mutate the stored dict
+        self.assertFalse(entry.result["cache_hit"])
+        self.assertNotIn("cache_note", entry.result)
+
+    def test_identical_concurrent_calls_share_one_run(self):
+        async def slow_invoke(*args, **kwargs):
+            await asyncio.sleep(0.01)
+            return b"analysis output", b""
+
+        self.mock_invoke.side_effect = slow_invoke
+
+        async def run():
+            return await asyncio.gather(
+                *(
+                    codex_delegate(
+                        task_description="Review this project",
+                        working_directory=self.temp_dir.name,
+                        sandbox_mode="read-only",
+                    )
+                    for _ in range(3)
+                )
+            )
+
+        results = asyncio.run(run())
+
+        self.assertEqual(self.mock_invoke.call_count, 1)
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(bridge_server._in_flight, {})
+
+
+class TestCacheSweeper(unittest.TestCase):
+    @pytest.mark.slow
+    @patch.object(bridge_server, "_CACHE_SWEEP_INTERVAL", 0.01)
+    def test_cache_stats_reports_background_sweep(self):
+        cache = ResultCache(ttl=0)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache.set("task", temp_dir, "mode", "sandbox", "format", {"r": 1})
+
+        async def run():
+            with patch.object(bridge_server, "result_cache", cache):
+                await bridge_server.cache_stats()
+                await asyncio.sleep(0.1)
+                return json.loads(await bridge_server.cache_stats())
+
+        with patch.dict(
+            bridge_server._last_sweep, {"last_sweep_at": None, "last_sweep_expired": 0}
+        ):
+            stats = asyncio.run(run())
+
+        self.assertIsNotNone(stats["last_sweep_at"])
+        self.assertEqual(stats["total_entries"], 0)
+
+
+class TestConcurrencyLimit(unittest.TestCase):
+    def test_codex_runs_are_bounded(self):
+        running = 0
+        peak = 0
+
+        async def fake_invoke(*args, **kwargs):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return b"output", b""
+
+        async def run(temp_dir):
+            await asyncio.gather(
+                *(
+                    codex_delegate(
+                        task_description=f"Review module {i}",
+                        working_directory=temp_dir,
+                        sandbox_mode="read-only",
+                    )
+                    for i in range(5)
+                )
+            )
+
+        with (
+            tempfile.TemporaryDirectory() as temp_dir,
+            patch.object(
+                bridge_server, "_codex_semaphore", asyncio.BoundedSemaphore(2)
+            ),
+            patch.object(bridge_server, "result_cache", ResultCache()),
+            patch.object(bridge_server.dde, "should_delegate", return_value=True),
+            patch.object(bridge_server, "invoke_codex_cli", side_effect=fake_invoke),
+        ):
+            asyncio.run(run(temp_dir))
+
+        self.assertEqual(peak, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
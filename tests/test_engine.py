@@ -2,30 +2,31 @@
 Unit tests for Delegation Decision Engine
 """
 
-import os
-import sys
 import tempfile
 import unittest
 
-# Must be before imports from src
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
-from claude_codex_bridge.engine import DelegationDecisionEngine  # noqa: E402
+from claude_codex_bridge.engine import DelegationDecisionEngine
 
 
 class TestDelegationDecisionEngine(unittest.TestCase):
     """Delegation Decision Engine test class"""
 
-    def setUp(self):
-        """Setup before tests"""
-        self.dde = DelegationDecisionEngine()
+    @classmethod
+    def setUpClass(cls):
+        """Setup once for all tests; the engine holds no per-test state"""
+        cls.dde = DelegationDecisionEngine()
+        cls.temp_dir = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Cleanup after all tests"""
+        cls.temp_dir.cleanup()
 
     def test_should_delegate_returns_true(self):
         """Test should_delegate method returns True"""
-        result = self.dde.should_delegate("refactor code")
-        self.assertTrue(result)
-
-        result = self.dde.should_delegate("generate tests")
-        self.assertTrue(result)
+        for task in ["refactor code", "generate tests"]:
+            with self.subTest(task=task):
+                self.assertTrue(self.dde.should_delegate(task))
 
     def test_prepare_codex_prompt_passthrough(self):
         """测试 prepare_codex_prompt 方法透传原始指令"""
@@ -35,9 +36,8 @@ class TestDelegationDecisionEngine(unittest.TestCase):
 
     def test_validate_working_directory_valid(self):
         """测试工作目录验证 - 有效目录"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            result = self.dde.validate_working_directory(temp_dir)
-            self.assertTrue(result)
+        result = self.dde.validate_working_directory(self.temp_dir.name)
+        self.assertTrue(result)
 
     def test_validate_working_directory_invalid_relative(self):
         """测试工作目录验证 - 相对路径无效"""
@@ -49,13 +49,20 @@ class TestDelegationDecisionEngine(unittest.TestCase):
         result = self.dde.validate_working_directory("/nonexistent/directory")
         self.assertFalse(result)
 
+    def test_validate_working_directory_file(self):
+        """测试工作目录验证 - 文件路径无效"""
+        with tempfile.NamedTemporaryFile() as temp_file:
+            result = self.dde.validate_working_directory(temp_file.name)
+            self.assertFalse(result)
+
     def test_validate_working_directory_dangerous_paths(self):
         """测试工作目录验证 - 危险路径"""
         dangerous_paths = ["/etc", "/usr/bin", "/bin", "/sbin", "/root"]
 
         for path in dangerous_paths:
-            result = self.dde.validate_working_directory(path)
-            self.assertFalse(result, f"危险路径 {path} 应该被拒绝")
+            with self.subTest(path=path):
+                result = self.dde.validate_working_directory(path)
+                self.assertFalse(result, f"危险路径 {path} 应该被拒绝")
 
 
 if __name__ == "__main__":
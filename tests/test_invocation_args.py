@@ -5,46 +5,30 @@ passed after a `--` delimiter so leading dashes are treated as text.
 
 import asyncio
 import os
+import signal
+import sys
 import unittest
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 
-from claude_codex_bridge.bridge_server import invoke_codex_cli
+import pytest
 
+from claude_codex_bridge import bridge_server
+from claude_codex_bridge.bridge_server import invoke_codex_cli
 
-class DummyProcess:
-    def __init__(self, returncode: int = 0, stdout: bytes = b"ok", stderr: bytes = b""):
-        self.returncode = returncode
-        self._stdout = stdout
-        self._stderr = stderr
 
-    async def communicate(self):
-        return self._stdout, self._stderr
-
-    def terminate(self):
-        pass
-
-    async def wait(self):
-        return
-
-    def kill(self):
-        pass
+def fake_process(stdout: bytes = b"ok", stderr: bytes = b"") -> AsyncMock:
+    """A finished Codex process that produced the given output."""
+    process = AsyncMock()
+    process.returncode = 0
+    process.communicate.return_value = (stdout, stderr)
+    return process
 
 
 class TestInvocationArgs(unittest.IsolatedAsyncioTestCase):
     async def test_prompt_passed_after_delimiter(self):
-        captured_args = {}
-
-        async def fake_subprocess_exec(*cmd, **kwargs):
-            captured_args["cmd"] = list(cmd)
-            captured_args["cwd"] = kwargs.get("cwd")
-            return DummyProcess(returncode=0, stdout=b"done", stderr=b"")
-
-        with patch.object(
-            asyncio, "create_subprocess_exec", side_effect=fake_subprocess_exec
-        ):
-            # Force read-only behavior to avoid write flags complicating the check
-            os.environ["CODEX_ALLOW_WRITE"] = "false"
+        runner = AsyncMock(return_value=fake_process(stdout=b"done"))
 
+        with patch.object(bridge_server, "_RUNNER", runner):
             prompt = "Analyze code"
             stdout, stderr = await invoke_codex_cli(
                 prompt=prompt,
@@ -54,27 +38,20 @@ class TestInvocationArgs(unittest.IsolatedAsyncioTestCase):
                 allow_write=False,
             )
 
-            self.assertEqual(stdout, "done")
-            self.assertEqual(stderr, "")
+            self.assertEqual(stdout, b"done")
+            self.assertEqual(stderr, b"")
 
-            cmd = captured_args["cmd"]
+            cmd = runner.call_args.args
             # Ensure structure includes `--` before prompt
             self.assertIn("--", cmd)
             self.assertEqual(cmd[-2], "--")
             self.assertEqual(cmd[-1], prompt)
+            self.assertEqual(runner.call_args.kwargs["cwd"], "/tmp")
 
     async def test_leading_dash_prompt_is_not_treated_as_flag(self):
-        captured_args = {}
-
-        async def fake_subprocess_exec(*cmd, **kwargs):
-            captured_args["cmd"] = list(cmd)
-            return DummyProcess(returncode=0, stdout=b"ok", stderr=b"")
-
-        with patch.object(
-            asyncio, "create_subprocess_exec", side_effect=fake_subprocess_exec
-        ):
-            os.environ["CODEX_ALLOW_WRITE"] = "false"
+        runner = AsyncMock(return_value=fake_process())
 
+        with patch.object(bridge_server, "_RUNNER", runner):
             prompt = "-a do something"
             await invoke_codex_cli(
                 prompt=prompt,
@@ -84,12 +61,162 @@ class TestInvocationArgs(unittest.IsolatedAsyncioTestCase):
                 allow_write=False,
             )
 
-            cmd = captured_args["cmd"]
+            cmd = runner.call_args.args
             # Verify that the literal prompt with leading dash is the final
             # positional arg
             self.assertIn("--", cmd)
             self.assertEqual(cmd[-1], prompt)
 
+    async def test_full_command_for_each_mode(self):
+        runner = AsyncMock(return_value=fake_process())
+
+        with patch.object(bridge_server, "_RUNNER", runner):
+            await invoke_codex_cli(
+                prompt="p",
+                working_directory="/tmp",
+                execution_mode="on-failure",
+                sandbox_mode="read-only",
+                allow_write=False,
+            )
+            self.assertEqual(
+                runner.call_args.args,
+                (
+                    "codex",
+                    "exec",
+                    "-C",
+                    "/tmp",
+                    "-c",
+                    "sandbox_permissions=[]",
+                    "-s",
+                    "read-only",
+                    "--",
+                    "p",
+                ),
+            )
+
+            await invoke_codex_cli(
+                prompt="p",
+                working_directory="/tmp",
+                execution_mode="on-failure",
+                sandbox_mode="workspace-write",
+                allow_write=True,
+            )
+            self.assertEqual(
+                runner.call_args.args,
+                ("codex", "exec", "-C", "/tmp", "--full-auto", "--", "p"),
+            )
+
+
+class StdinProcess:
+    """Process that is still running until its prompt arrives on stdin."""
+
+    def __init__(self, cmd):
+        self.cmd = list(cmd)
+        self.input = None
+        self.returncode = None
+
+    async def communicate(self, input=None):
+        self.input = input
+        self.returncode = 0
+        return b"ok", b""
+
+    def kill(self):
+        self.returncode = -9
+
+    async def wait(self):
+        return self.returncode
+
+
+class TestWarmPool(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.spawned = []
+        patcher = patch.object(bridge_server, "_CODEX_POOL_SIZE", 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        bridge_server._warm_processes.clear()
+        self.addCleanup(bridge_server._warm_processes.clear)
+
+    async def fake_subprocess_exec(self, *cmd, **kwargs):
+        process = StdinProcess(cmd)
+        self.spawned.append(process)
+        return process
+
+    async def invoke(self, prompt):
+        stdout, _ = await invoke_codex_cli(
+            prompt=prompt,
+            working_directory="/tmp",
+            execution_mode="on-failure",
+            sandbox_mode="read-only",
+            allow_write=False,
+        )
+        await asyncio.gather(*bridge_server._warm_tasks)
+        return stdout
+
+    async def test_prompt_sent_on_stdin_to_prespawned_process(self):
+        with patch.object(bridge_server, "_RUNNER", self.fake_subprocess_exec):
+            await self.invoke("first")
+            # One process for the call, one prespawned for the next call
+            self.assertEqual(len(self.spawned), 2)
+            first, warm = self.spawned
+            self.assertEqual(first.cmd[-2:], ["--", "-"])
+            self.assertEqual(first.input, b"first")
+
+            await self.invoke("second")
+            # The warm process served the call and a new one was prespawned
+            self.assertEqual(warm.input, b"second")
+            self.assertEqual(len(self.spawned), 3)
+
+
+class TestThreadedSpawn(unittest.IsolatedAsyncioTestCase):
+    @patch.object(bridge_server, "_THREADED_SPAWN", True)
+    async def test_threaded_process_round_trip(self):
+        process = await bridge_server._spawn_codex(
+            (sys.executable, "-c", "import sys; print(sys.stdin.read().upper())"),
+            os.getcwd(),
+            stdin=asyncio.subprocess.PIPE,
+        )
+        self.assertIsInstance(process, bridge_server._ThreadedProcess)
+
+        stdout, stderr = await process.communicate(b"prompt")
+        self.assertEqual(stdout.strip(), b"PROMPT")
+        self.assertEqual(process.returncode, 0)
+
+    @patch.object(bridge_server, "_CODEX_POOL_SIZE", 1)
+    @patch.object(bridge_server, "_THREADED_SPAWN", True)
+    async def test_stale_warm_process_is_reaped(self):
+        bridge_server._warm_processes.clear()
+        self.addCleanup(bridge_server._warm_processes.clear)
+        idle = (sys.executable, "-c", "import sys; sys.stdin.read()")
+
+        await bridge_server._refill_warm_pool(idle, os.getcwd())
+        (stale,) = bridge_server._warm_processes
+        await bridge_server._refill_warm_pool((*idle, "changed"), os.getcwd())
+        (fresh,) = bridge_server._warm_processes
+
+        # Popen only records the exit status once the child has been waited on
+        self.assertIsNotNone(stale._popen.returncode)
+        await bridge_server._discard_warm_process(fresh)
+
+
+class TestStopProcess(unittest.IsolatedAsyncioTestCase):
+    @pytest.mark.slow
+    @unittest.skipIf(os.name == "nt", "POSIX signals only")
+    @patch.object(bridge_server, "_STOP_GRACE", 0.2)
+    async def test_escalates_when_sigint_is_ignored(self):
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-c",
+            "import signal, time\n"
+            "signal.signal(signal.SIGINT, signal.SIG_IGN)\n"
+            "print('ready', flush=True)\n"
+            "time.sleep(30)",
+            stdout=asyncio.subprocess.PIPE,
+        )
+        await process.stdout.readline()
+
+        await bridge_server._stop_process(process)
+        self.assertEqual(process.returncode, -signal.SIGTERM)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,63 @@
+"""
+Tests for command-line flag handling in the server entry point.
+"""
+
+import os
+import unittest
+from unittest.mock import patch
+
+from claude_codex_bridge import __main__ as entry_point
+
+
+class TestMainFlags(unittest.TestCase):
+    def run_main(self, *argv):
+        with (
+            patch.object(entry_point.sys, "argv", ["claude-codex-bridge", *argv]),
+            patch.dict(os.environ),
+            patch.object(entry_point, "set_allow_write") as mock_set_allow_write,
+            patch.object(entry_point, "_run_server"),
+            patch.object(entry_point.logging, "basicConfig") as mock_logging,
+        ):
+            entry_point.main()
+        (allow_write,) = mock_set_allow_write.call_args.args
+        return allow_write, mock_logging.call_args.kwargs["level"]
+
+    def test_exact_flags(self):
+        self.assertEqual(self.run_main(), (False, entry_point.logging.WARNING))
+        self.assertEqual(
+            self.run_main("--allow-write", "--verbose"),
+            (True, entry_point.logging.INFO),
+        )
+
+    def test_abbreviated_flags_are_honoured(self):
+        self.assertEqual(
+            self.run_main("--allow", "--verb"), (True, entry_point.logging.INFO)
+        )
+
+    def test_unknown_flag_is_rejected(self):
+        with patch("sys.stderr"), self.assertRaises(SystemExit):
+            self.run_main("--bogus")
+
+
+class TestRunServer(unittest.TestCase):
+    @patch.object(entry_point.anyio, "run")
+    @patch.object(entry_point.mcp, "run")
+    def test_uses_uvloop_only_for_this_run(self, mock_mcp_run, mock_anyio_run):
+        with patch.object(entry_point.importlib.util, "find_spec", return_value=None):
+            entry_point._run_server()
+        mock_mcp_run.assert_called_once_with()
+        mock_anyio_run.assert_not_called()
+
+        mock_mcp_run.reset_mock()
+        with patch.object(
+            entry_point.importlib.util, "find_spec", return_value=object()
+        ):
+            entry_point._run_server()
+        mock_mcp_run.assert_not_called()
+        mock_anyio_run.assert_called_once_with(
+            entry_point.mcp.run_stdio_async, backend_options={"use_uvloop": True}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Tests for output type detection in parse_codex_output.
+"""
+
+import unittest
+
+from claude_codex_bridge.bridge_server import parse_codex_output
+
+
+class TestParseCodexOutput(unittest.TestCase):
+    def assertDetected(self, stdout: bytes, expected: str) -> None:
+        result = parse_codex_output(stdout, "explanation")
+        self.assertEqual(result["type"], expected)
+        self.assertEqual(result["detected_type"], expected)
+
+    def test_diff_detected(self):
+        self.assertDetected(b"--- a/x.py\n+++ b/x.py\n@@ -1 +1 @@\n", "diff")
+
+    def test_diff_markers_in_any_order(self):
+        # Both markers anywhere in the output count, whatever their order
+        self.assertDetected(b"+++ b/x.py\nnote\n--- a/x.py\n", "diff")
+
+    def test_one_diff_marker_is_not_a_diff(self):
+        self.assertDetected(b"--- a/x.py only", "explanation")
+
+    def test_fenced_block_detected_as_code(self):
+        self.assertDetected(b"Here:\n```python\nx = 1\n```\n", "code")
+
+    def test_single_fence_is_not_a_code_block(self):
+        self.assertDetected(b"Use ``` to open a block", "explanation")
+
+    def test_fences_do_not_overlap(self):
+        # Matches str.count semantics: a run of backticks is not re-scanned
+        self.assertDetected(b"````", "explanation")
+        self.assertDetected(b"``````", "code")
+
+    def test_keywords_are_case_insensitive(self):
+        self.assertDetected(b"See FILE: main.py", "code")
+        self.assertDetected(b"The Class Foo handles it", "code")
+        self.assertDetected(b"Import the module first", "code")
+        self.assertDetected(b"The function is fine as written.", "code")
+
+    def test_keywords_match_inside_words(self):
+        # Same as the old substring checks: no word-boundary anchoring
+        self.assertDetected(b"Create a subclass Foo", "code")
+        self.assertDetected(b"(def helper)", "code")
+
+    def test_plain_text_is_explanation(self):
+        self.assertDetected(b"Everything looks correct.", "explanation")
+
+    def test_content_is_stripped(self):
+        result = parse_codex_output(b"  done  \n", "json")
+        self.assertEqual(result["content"], "done")
+        self.assertEqual(result["format"], "json")
+        self.assertEqual(result["status"], "success")
+
+    def test_invalid_utf8_is_replaced(self):
+        # A stray byte from Codex output must not fail the whole response
+        result = parse_codex_output(b"caf\xe9 ok", "explanation")
+        self.assertEqual(result["content"], "caf\ufffd ok")
+
+
+if __name__ == "__main__":
+    unittest.main()
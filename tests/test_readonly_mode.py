@@ -3,227 +3,266 @@ Tests for read-only mode enforcement and --allow-write flag functionality.
 """
 
 import json
-import os
+import tempfile
 import unittest
+from types import MappingProxyType
 from unittest.mock import patch
 
-from claude_codex_bridge.bridge_server import codex_delegate
+from claude_codex_bridge import bridge_server
+from claude_codex_bridge.bridge_server import codex_delegate, set_allow_write
+
+# The structure that should be included when mode is overridden
+_EXPECTED_NOTICE = MappingProxyType(
+    {
+        "mode": "planning",
+        "description": "Operating in planning and analysis mode (read-only)",
+        "message": "Codex will analyze your code and provide detailed "
+        "recommendations without modifying files.",
+        "hint": "To apply changes, restart the server with --allow-write flag",
+        "benefits": [
+            "Safe exploration of solutions",
+            "Comprehensive analysis without risk",
+            "Thoughtful planning before execution",
+        ],
+    }
+)
+
+
+class TestReadOnlyMode(unittest.IsolatedAsyncioTestCase):
+    """Test read-only mode enforcement and write permission handling."""
 
+    @classmethod
+    def setUpClass(cls):
+        """Create one working directory shared by all tests."""
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.working_directory = cls.temp_dir.name
 
-class TestReadOnlyMode(unittest.TestCase):
-    """Test read-only mode enforcement and write permission handling."""
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the shared working directory."""
+        cls.temp_dir.cleanup()
 
     def setUp(self):
         """Setup before tests."""
-        # Reset environment for clean test state
-        if "CODEX_ALLOW_WRITE" in os.environ:
-            del os.environ["CODEX_ALLOW_WRITE"]
-
-    def tearDown(self):
-        """Cleanup after tests."""
-        # Reset environment
-        if "CODEX_ALLOW_WRITE" in os.environ:
-            del os.environ["CODEX_ALLOW_WRITE"]
-
-    @patch.dict(os.environ, {"CODEX_ALLOW_WRITE": "false"})
-    @patch("claude_codex_bridge.bridge_server.invoke_codex_cli")
-    @patch("claude_codex_bridge.bridge_server.dde.validate_working_directory")
-    @patch("claude_codex_bridge.bridge_server.dde.should_delegate")
-    @patch("claude_codex_bridge.bridge_server.result_cache.get")
-    async def test_sandbox_mode_forced_to_readonly_when_write_disabled(
-        self, mock_cache_get, mock_should_delegate, mock_validate_dir, mock_invoke_codex
+        # The write flag is read once at import; start each test read-only
+        # and restore whatever the module had afterwards
+        patcher = patch.object(bridge_server, "_ALLOW_WRITE", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Directory validation is memoized; start each test uncached
+        bridge_server._valid_directories.clear()
+
+    async def delegate(self, **kwargs):
+        """Call codex_delegate and decode its JSON response."""
+        return json.loads(await codex_delegate(**kwargs))
+
+    @patch.object(bridge_server, "invoke_codex_cli", return_value=(b"mock output", b""))
+    @patch.object(bridge_server.dde, "validate_working_directory", return_value=True)
+    @patch.object(bridge_server.dde, "should_delegate", return_value=True)
+    @patch.object(bridge_server.result_cache, "aset")
+    @patch.object(
+        bridge_server.result_cache, "aget_with_files_hash", return_value=(None, None)
+    )
+    async def test_sandbox_mode_resolution(
+        self,
+        mock_cache_get,
+        mock_cache_set,
+        mock_should_delegate,
+        mock_validate_dir,
+        mock_invoke_codex,
     ):
-        """Test that sandbox_mode is forced to read-only when write is disabled."""
-        # Setup mocks
-        mock_validate_dir.return_value = True
-        mock_should_delegate.return_value = True
-        mock_cache_get.return_value = None
-        mock_invoke_codex.return_value = ("mock output", "")
-
-        # Call with workspace-write but expect read-only to be enforced
-        result_json = await codex_delegate(
+        """Test the effective sandbox mode for each write setting and request."""
+        # (allow_write, requested mode, effective mode, planning notice expected)
+        cases = [
+            # Write disabled: workspace-write is forced to read-only
+            (False, "workspace-write", "read-only", True),
+            # Write enabled: the requested mode is preserved
+            (True, "workspace-write", "workspace-write", False),
+            # Already read-only: nothing is overridden
+            (False, "read-only", "read-only", False),
+        ]
+        for allow_write, requested, effective, notice in cases:
+            with self.subTest(allow_write=allow_write, requested=requested):
+                mock_invoke_codex.reset_mock()
+                with patch.object(bridge_server, "_ALLOW_WRITE", allow_write):
+                    result = await self.delegate(
+                        task_description="Test task",
+                        working_directory=self.working_directory,
+                        sandbox_mode=requested,
+                    )
+
+                self.assertEqual(result["sandbox_mode"], effective)
+                self.assertEqual(result["requested_sandbox_mode"], requested)
+                if notice:
+                    self.assertEqual(result["operation_mode"]["mode"], "planning")
+                else:
+                    self.assertNotIn("operation_mode", result)
+
+                # Verify codex was called with the effective mode
+                mock_invoke_codex.assert_called_once()
+                _, _, _, sandbox_arg, *_ = mock_invoke_codex.call_args.args
+                self.assertEqual(sandbox_arg, effective)
+
+    # Failing validation triggers the error response
+    @patch.object(bridge_server.dde, "validate_working_directory", return_value=False)
+    @patch.object(bridge_server.result_cache, "aget_with_files_hash")
+    async def test_mode_notice_included_in_error_response(
+        self, mock_cache_get, mock_validate_dir
+    ):
+        """Test that mode notice is included in error responses."""
+        # Call with workspace-write but expect error with mode notice
+        result = await self.delegate(
             task_description="Test task",
-            working_directory="/tmp/test",
+            working_directory="/invalid/path",
             sandbox_mode="workspace-write",
         )
 
-        result = json.loads(result_json)
+        # Verify error response
+        self.assertEqual(result["status"], "error")
 
-        # Verify that the effective sandbox mode was read-only
+        # Should still have the mode override information
         self.assertEqual(result["sandbox_mode"], "read-only")
         self.assertEqual(result["requested_sandbox_mode"], "workspace-write")
-
-        # Verify operation_mode notice is included
-        self.assertIn("operation_mode", result)
         self.assertEqual(result["operation_mode"]["mode"], "planning")
 
-        # Verify codex was called with read-only mode
-        mock_invoke_codex.assert_called_once()
-        call_args = mock_invoke_codex.call_args[0]
-        self.assertEqual(call_args[3], "read-only")  # sandbox_mode parameter
-
-    @patch.dict(os.environ, {"CODEX_ALLOW_WRITE": "true"})
-    @patch("claude_codex_bridge.bridge_server.invoke_codex_cli")
-    @patch("claude_codex_bridge.bridge_server.dde.validate_working_directory")
-    @patch("claude_codex_bridge.bridge_server.dde.should_delegate")
-    @patch("claude_codex_bridge.bridge_server.result_cache.get")
-    async def test_sandbox_mode_preserved_when_write_enabled(
-        self, mock_cache_get, mock_should_delegate, mock_validate_dir, mock_invoke_codex
+        # The error path returns before any cache lookup
+        mock_cache_get.assert_not_awaited()
+
+    @patch.object(bridge_server, "invoke_codex_cli", return_value=(b"mock output", b""))
+    @patch.object(bridge_server.dde, "validate_working_directory", return_value=True)
+    @patch.object(bridge_server.dde, "should_delegate", return_value=True)
+    @patch.object(bridge_server.result_cache, "aset")
+    @patch.object(
+        bridge_server.result_cache, "aget_with_files_hash", return_value=(None, None)
+    )
+    async def test_set_allow_write_applies_to_next_call(
+        self,
+        mock_cache_get,
+        mock_cache_set,
+        mock_should_delegate,
+        mock_validate_dir,
+        mock_invoke_codex,
     ):
-        """Test that sandbox_mode is preserved when write is enabled."""
-        # Setup mocks
-        mock_validate_dir.return_value = True
-        mock_should_delegate.return_value = True
-        mock_cache_get.return_value = None
-        mock_invoke_codex.return_value = ("mock output", "")
-
-        # Call with workspace-write and expect it to be preserved
-        result_json = await codex_delegate(
+        """Test that set_allow_write takes effect without re-reading env."""
+        set_allow_write(True)
+        result = await self.delegate(
             task_description="Test task",
-            working_directory="/tmp/test",
+            working_directory=self.working_directory,
             sandbox_mode="workspace-write",
         )
 
-        result = json.loads(result_json)
-
-        # Verify that the sandbox mode was preserved
         self.assertEqual(result["sandbox_mode"], "workspace-write")
-        self.assertEqual(result["requested_sandbox_mode"], "workspace-write")
-
-        # Verify no operation_mode notice is included
         self.assertNotIn("operation_mode", result)
 
-        # Verify codex was called with workspace-write mode
-        mock_invoke_codex.assert_called_once()
-        call_args = mock_invoke_codex.call_args[0]
-        self.assertEqual(call_args[3], "workspace-write")  # sandbox_mode parameter
-
-    @patch.dict(os.environ, {"CODEX_ALLOW_WRITE": "false"})
-    @patch("claude_codex_bridge.bridge_server.invoke_codex_cli")
-    @patch("claude_codex_bridge.bridge_server.dde.validate_working_directory")
-    @patch("claude_codex_bridge.bridge_server.dde.should_delegate")
-    @patch("claude_codex_bridge.bridge_server.result_cache.get")
-    async def test_readonly_mode_not_overridden_when_already_readonly(
-        self, mock_cache_get, mock_should_delegate, mock_validate_dir, mock_invoke_codex
-    ):
-        """Test that read-only mode is not overridden when already read-only."""
-        # Setup mocks
-        mock_validate_dir.return_value = True
-        mock_should_delegate.return_value = True
-        mock_cache_get.return_value = None
-        mock_invoke_codex.return_value = ("mock output", "")
-
-        # Call with read-only mode
-        result_json = await codex_delegate(
-            task_description="Test task",
-            working_directory="/tmp/test",
-            sandbox_mode="read-only",
+    def test_operation_mode_notice_structure(self):
+        """Test the structure of operation_mode notice."""
+        # Verify all expected fields are present
+        self.assertLessEqual(
+            {"mode", "description", "message", "hint", "benefits"},
+            _EXPECTED_NOTICE.keys(),
         )
-
-        result = json.loads(result_json)
-
-        # Verify that read-only mode was preserved and no notice was added
-        self.assertEqual(result["sandbox_mode"], "read-only")
-        self.assertEqual(result["requested_sandbox_mode"], "read-only")
-
-        # Should not have operation_mode notice since no override occurred
-        self.assertNotIn("operation_mode", result)
-
-    @patch.dict(os.environ, {"CODEX_ALLOW_WRITE": "false"})
-    @patch("claude_codex_bridge.bridge_server.dde.validate_working_directory")
-    async def test_mode_notice_included_in_error_response(self, mock_validate_dir):
-        """Test that mode notice is included in error responses."""
-        # Setup mock to trigger an error
-        mock_validate_dir.return_value = False
-
-        # Call with workspace-write but expect error with mode notice
-        result_json = await codex_delegate(
+        self.assertIsInstance(_EXPECTED_NOTICE["benefits"], list)
+        self.assertEqual(len(_EXPECTED_NOTICE["benefits"]), 3)
+
+        # The server attaches exactly this notice when mode is overridden
+        self.assertEqual(bridge_server._MODE_NOTICE_PLANNING, dict(_EXPECTED_NOTICE))
+
+    @patch.object(bridge_server, "invoke_codex_cli", return_value=(b"mock output", b""))
+    @patch.object(bridge_server.dde, "validate_working_directory", return_value=True)
+    @patch.object(bridge_server.dde, "should_delegate", return_value=True)
+    @patch.object(
+        bridge_server.result_cache, "aget_with_files_hash", return_value=(None, None)
+    )
+    @patch.object(bridge_server.result_cache, "aset")
+    async def test_cache_uses_effective_sandbox_mode(
+        self,
+        mock_cache_set,
+        mock_cache_get,
+        mock_should_delegate,
+        mock_validate,
+        mock_invoke,
+    ):
+        """Test that cache operations use effective sandbox mode."""
+        await codex_delegate(
             task_description="Test task",
-            working_directory="/invalid/path",
+            working_directory=self.working_directory,
             sandbox_mode="workspace-write",
         )
 
-        result = json.loads(result_json)
-
-        # Verify error response
-        self.assertEqual(result["status"], "error")
-
-        # Should still have the mode override information
-        self.assertEqual(result["sandbox_mode"], "read-only")
-        self.assertEqual(result["requested_sandbox_mode"], "workspace-write")
+        # Verify cache.get was called with effective mode (read-only)
+        mock_cache_get.assert_called_once()
+        _, _, execution_mode, sandbox_mode, *_ = mock_cache_get.call_args.args
+        self.assertEqual(execution_mode, "on-failure")
+        self.assertEqual(sandbox_mode, "read-only")
+
+        # Verify cache.set was called with effective mode (read-only)
+        mock_cache_set.assert_called_once()
+        _, _, execution_mode, sandbox_mode, *_ = mock_cache_set.call_args.args
+        self.assertEqual(execution_mode, "on-failure")
+        self.assertEqual(sandbox_mode, "read-only")
+
+    @patch.object(bridge_server, "invoke_codex_cli", return_value=(b"mock output", b""))
+    @patch.object(bridge_server.dde, "validate_working_directory", return_value=True)
+    @patch.object(bridge_server.dde, "should_delegate", return_value=True)
+    @patch.object(
+        bridge_server.result_cache,
+        "aget_with_files_hash",
+        return_value=(None, "lookup-hash"),
+    )
+    @patch.object(bridge_server.result_cache, "aset")
+    async def test_store_reuses_lookup_hash_only_when_read_only(
+        self,
+        mock_cache_set,
+        mock_cache_get,
+        mock_should_delegate,
+        mock_validate,
+        mock_invoke,
+    ):
+        """Only read-only runs store under the hash taken for the lookup."""
+        for allow_write, expected_hash in ((False, "lookup-hash"), (True, None)):
+            with self.subTest(allow_write=allow_write):
+                mock_cache_set.reset_mock()
+                with patch.object(bridge_server, "_ALLOW_WRITE", allow_write):
+                    await codex_delegate(
+                        task_description="Test task",
+                        working_directory=self.working_directory,
+                        sandbox_mode="workspace-write",
+                    )
+                self.assertEqual(
+                    mock_cache_set.call_args.kwargs["files_hash"], expected_hash
+                )
+
+
+class TestWorkingDirectoryValidationMemo(unittest.TestCase):
+    """Test memoization of working directory validation."""
 
-    def test_operation_mode_notice_structure(self):
-        """Test the structure of operation_mode notice."""
-        # This tests the structure that should be included when mode is overridden
-        expected_notice = {
-            "mode": "planning",
-            "description": "Operating in planning and analysis mode (read-only)",
-            "message": "Codex will analyze your code and provide detailed "
-            "recommendations without modifying files.",
-            "hint": "To apply changes, restart the server with --allow-write flag",
-            "benefits": [
-                "Safe exploration of solutions",
-                "Comprehensive analysis without risk",
-                "Thoughtful planning before execution",
-            ],
-        }
+    def setUp(self):
+        bridge_server._valid_directories.clear()
 
-        # Verify all expected fields are present
-        self.assertIn("mode", expected_notice)
-        self.assertIn("description", expected_notice)
-        self.assertIn("message", expected_notice)
-        self.assertIn("hint", expected_notice)
-        self.assertIn("benefits", expected_notice)
-        self.assertIsInstance(expected_notice["benefits"], list)
-        self.assertEqual(len(expected_notice["benefits"]), 3)
-
-    @patch("claude_codex_bridge.bridge_server.result_cache.get")
-    @patch("claude_codex_bridge.bridge_server.result_cache.set")
-    async def test_cache_uses_effective_sandbox_mode(
-        self, mock_cache_set, mock_cache_get
-    ):
-        """Test that cache operations use effective sandbox mode."""
-        with patch.dict(os.environ, {"CODEX_ALLOW_WRITE": "false"}):
-            with patch(
-                "claude_codex_bridge.bridge_server.invoke_codex_cli"
-            ) as mock_invoke:
-                with patch(
-                    "claude_codex_bridge.bridge_server.dde.validate_working_directory"
-                ) as mock_validate:
-                    with patch(
-                        "claude_codex_bridge.bridge_server.dde.should_delegate"
-                    ) as mock_should_delegate:
-                        # Setup mocks
-                        mock_validate.return_value = True
-                        mock_should_delegate.return_value = True
-                        mock_cache_get.return_value = None
-                        mock_invoke.return_value = ("mock output", "")
-
-                        await codex_delegate(
-                            task_description="Test task",
-                            working_directory="/tmp/test",
-                            sandbox_mode="workspace-write",
-                        )
-
-                        # Verify cache.get was called with effective mode (read-only)
-                        mock_cache_get.assert_called_once()
-                        cache_get_args = mock_cache_get.call_args[0]
-                        self.assertEqual(
-                            cache_get_args[2], "on-failure"
-                        )  # execution_mode
-                        self.assertEqual(
-                            cache_get_args[3], "read-only"
-                        )  # effective_sandbox_mode
-
-                        # Verify cache.set was called with effective mode (read-only)
-                        mock_cache_set.assert_called_once()
-                        cache_set_args = mock_cache_set.call_args[0]
-                        self.assertEqual(
-                            cache_set_args[2], "on-failure"
-                        )  # execution_mode
-                        self.assertEqual(
-                            cache_set_args[3], "read-only"
-                        )  # effective_sandbox_mode
+    def tearDown(self):
+        bridge_server._valid_directories.clear()
+
+    @patch.object(bridge_server.dde, "validate_working_directory")
+    def test_only_successes_are_memoized(self, mock_validate):
+        """Valid directories are cached; invalid ones are re-checked."""
+        mock_validate.return_value = True
+        self.assertTrue(bridge_server._validate_working_directory("/tmp/a"))
+        self.assertTrue(bridge_server._validate_working_directory("/tmp/a"))
+        self.assertEqual(mock_validate.call_count, 1)
+
+        mock_validate.return_value = False
+        self.assertFalse(bridge_server._validate_working_directory("/tmp/b"))
+        self.assertFalse(bridge_server._validate_working_directory("/tmp/b"))
+        self.assertEqual(mock_validate.call_count, 3)
+
+    @patch.object(bridge_server, "_WD_VALIDATE_TTL", 0)
+    @patch.object(bridge_server.dde, "validate_working_directory")
+    def test_zero_ttl_disables_memo(self, mock_validate):
+        """WD_VALIDATE_TTL=0 validates on every call."""
+        mock_validate.return_value = True
+        bridge_server._validate_working_directory("/tmp/a")
+        bridge_server._validate_working_directory("/tmp/a")
+        self.assertEqual(mock_validate.call_count, 2)
 
 
 if __name__ == "__main__":